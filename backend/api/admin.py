@@ -1,32 +1,44 @@
 from django.contrib import admin
+from django.db import transaction
 
 from .models import (Recipe, Tag, Ingredient, RecipeIngredient,
                      Subscription, Favorite, ShoppingCart)
+from .shopping_list import remove_recipe_from_shopping_list
 
 
 class RecipeIngredientInline(admin.TabularInline):
-    """Inline отображение для ингредиентов рецепта в админке."""
+    """
+    Inline отображение для ингредиентов рецепта в админке. Только для
+    чтения: итоги списков покупок пересчитываются при изменении
+    ингредиентов через API, а не при сохранении отдельных строк.
+    """
 
     model = RecipeIngredient
-    extra = 1
-    fields = ('id', 'ingredient', 'amount')
+    extra = 0
+    fields = ('ingredient', 'amount')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 class RecipeAdmin(admin.ModelAdmin):
     """Админ-класс для управления рецептами."""
 
-    list_display = ('id', 'name', 'author', 'cooking_time', 'favorites_count')
+    list_display = ('id', 'name', 'author', 'cooking_time', 'favorites_count',
+                    'shopping_cart_count')
     inlines = [RecipeIngredientInline]
     filter_horizontal = ('tags',)
     list_display_links = ('name',)
     search_fields = ('name', 'author__username')
     list_filter = ('tags', 'author')
-
-    def favorites_count(self, obj):
-        """Возвращает количество добавлений рецепта в избранное."""
-        return obj.favorites.count()
-
-    favorites_count.short_description = 'Добавлено в избранное'
+    list_select_related = ('author',)
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -37,13 +49,32 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
-    """Админ-класс для управления списками покупок."""
+    """
+    Админ-класс для просмотра списков покупок. Добавлять и менять записи
+    можно только через API; при удалении вычитаются итоги списков.
+    """
 
     list_display = ('user', 'recipe')
     list_filter = ('user',)
     list_display_links = ('user', 'recipe')
     search_fields = ('user__email', 'recipe__name')
 
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        remove_recipe_from_shopping_list(obj.user, obj.recipe)
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for obj in queryset.select_related('user', 'recipe'):
+            self.delete_model(request, obj)
+
 
 class SubscriptionAdmin(admin.ModelAdmin):
     """Админ-класс для управления подписками."""
@@ -0,0 +1,109 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+from .metrics import request_stats, track_queries
+
+ASYNC_READ_ROUTES = (
+    'recipes-list',
+    'recipes-detail',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'recipe_detail',
+)
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+database_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS,
+    thread_name_prefix='database'
+)
+
+
+def call_view(view, stats, request, *args, **kwargs):
+    """
+    Вызывает синхронное представление и отрисовывает ответ в том же
+    потоке, учитывая SQL-запросы в показателях запроса.
+    """
+    token = request_stats.set(stats)
+    try:
+        with track_queries(stats) if stats else nullcontext():
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response.render()
+    finally:
+        request_stats.reset(token)
+    return response
+
+
+def call_view_in_pool(view, stats, request, *args, **kwargs):
+    """
+    Вызов представления в потоке пула. Сигналы начала и конца запроса
+    закрывают подключения только в общем потоке синхронного кода,
+    поэтому устаревшие подключения пула закрываются здесь.
+    """
+    close_old_connections()
+    try:
+        return call_view(view, stats, request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def make_async_view(view, read_in_pool):
+    """
+    Асинхронная обёртка синхронного представления.
+    Django 3.2 выполняет все синхронные представления под ASGI в одном
+    общем потоке, поэтому медленный запрос к базе задерживает остальные.
+    Чтение (read_in_pool) выполняется в пуле из settings.ASYNC_DB_THREADS
+    потоков со своими подключениями, а изменения — по-прежнему в общем
+    потоке, как у обычного синхронного представления.
+    """
+    call_shared = sync_to_async(call_view, thread_sensitive=True)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        stats = request_stats.get()
+        if read_in_pool and request.method in READ_METHODS:
+            return await asyncio.get_running_loop().run_in_executor(
+                database_executor,
+                partial(call_view_in_pool, view, stats, request,
+                        *args, **kwargs)
+            )
+        return await call_shared(view, stats, request, *args, **kwargs)
+
+    return async_view
+
+
+def make_async_urlpatterns(urlpatterns):
+    """
+    Заменяет представления маршрутов асинхронными обёртками, в том числе
+    внутри include со списком маршрутов (router.urls). Маршруты,
+    подключённые модулем (djoser.urls), остаются синхронными.
+    """
+    result = []
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLPattern):
+            pattern = URLPattern(
+                pattern.pattern,
+                make_async_view(pattern.callback,
+                                pattern.name in ASYNC_READ_ROUTES),
+                pattern.default_args,
+                pattern.name
+            )
+        elif isinstance(pattern.urlconf_name, list):
+            pattern = URLResolver(
+                pattern.pattern,
+                make_async_urlpatterns(pattern.urlconf_name),
+                pattern.default_kwargs,
+                pattern.app_name,
+                pattern.namespace
+            )
+        result.append(pattern)
+    return result
@@ -0,0 +1,140 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .models import Recipe
+
+REFERENCE_DATA_VERSION_KEY = 'reference_data_version'
+RECIPE_LIST_GENERATION_KEY = 'recipe_list_generation'
+MAX_CACHED_PAYLOADS = 1024
+CACHED_RESPONSES = ('recipes-list', 'recipes-retrieve')
+
+pending_invalidations = ContextVar('pending_invalidations', default=None)
+
+
+def get_version_cache():
+    """Хранилище версий без вытеснения (settings.VERSION_CACHE)."""
+    return caches[settings.VERSION_CACHE]
+
+
+def get_version(key):
+    """
+    Возвращает версию из общего хранилища, одинаковую во всех процессах.
+    Отсутствующая версия создаётся из текущего времени, поэтому
+    удаление ключа тоже меняет версию.
+    """
+    versions = get_version_cache()
+    version = versions.get(key)
+    if version is None:
+        versions.add(key, time.time_ns(), timeout=None)
+        version = versions.get(key)
+    return version
+
+
+def bump_version(key):
+    """Меняет версию в общем хранилище."""
+    versions = get_version_cache()
+    try:
+        versions.incr(key)
+    except ValueError:
+        versions.set(key, time.time_ns(), timeout=None)
+
+
+def get_reference_data_version():
+    """Возвращает текущую версию справочников (тегов и ингредиентов)."""
+    return get_version(REFERENCE_DATA_VERSION_KEY)
+
+
+def bump_reference_data_version():
+    """Меняет версию справочников после изменения тегов или ингредиентов."""
+    bump_version(REFERENCE_DATA_VERSION_KEY)
+
+
+def get_recipe_list_generation():
+    """Поколение списков рецептов: меняется при любом изменении рецептов."""
+    return get_version(RECIPE_LIST_GENERATION_KEY)
+
+
+def get_recipe_generation(recipe_id):
+    """
+    Поколение одного рецепта из столбца cache_generation: меняется
+    при изменении этого рецепта. Для несуществующего рецепта — None.
+    """
+    try:
+        return Recipe.objects.filter(pk=recipe_id).values_list(
+            'cache_generation', flat=True).first()
+    except (TypeError, ValueError):
+        return None
+
+
+def invalidate_recipe_responses(recipe_ids=()):
+    """
+    После фиксации транзакции меняет поколение списков рецептов
+    и перечисленных рецептов, чтобы кэш ответов не отдал старые данные.
+    Внутри batch_invalidations изменение откладывается.
+    """
+    recipe_ids = set(recipe_ids)
+    pending = pending_invalidations.get()
+    if pending is not None:
+        pending |= recipe_ids
+        return
+
+    def bump():
+        if recipe_ids:
+            Recipe.objects.filter(id__in=recipe_ids).update(
+                cache_generation=F('cache_generation') + 1
+            )
+        bump_version(RECIPE_LIST_GENERATION_KEY)
+
+    transaction.on_commit(bump)
+
+
+@contextmanager
+def batch_invalidations():
+    """
+    Копит сброс кэша рецептов и применяет его одним UPDATE после
+    фиксации. Нужен при каскадном удалении: сигнал приходит для каждого
+    рецепта и каждого его ингредиента.
+    """
+    if pending_invalidations.get() is not None:
+        yield
+        return
+    recipe_ids = set()
+    token = pending_invalidations.set(recipe_ids)
+    try:
+        yield
+    finally:
+        pending_invalidations.reset(token)
+    invalidate_recipe_responses(recipe_ids)
+
+
+class VersionedPayloadCache:
+    """
+    Кэш сериализованных ответов в памяти процесса.
+    Хранит данные только для одной, последней версии справочников.
+    """
+
+    def __init__(self, max_size=MAX_CACHED_PAYLOADS):
+        self.max_size = max_size
+        self._version = None
+        self._payloads = {}
+
+    def get(self, version, key):
+        if version != self._version:
+            return None
+        return self._payloads.get(key)
+
+    def set(self, version, key, payload):
+        if version != self._version:
+            self._version = version
+            self._payloads = {}
+        if len(self._payloads) < self.max_size:
+            self._payloads[key] = payload
+
+
+reference_payloads = VersionedPayloadCache()
@@ -0,0 +1,92 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import (Case, Count, F, IntegerField, OuterRef,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce, Greatest
+
+pending_changes = ContextVar('pending_counter_changes', default=None)
+
+
+def refresh_counters(instance, fields):
+    """
+    Перечитывает счётчики объекта из базы перед полным сохранением,
+    чтобы устаревшие значения в памяти не затёрли изменения,
+    сделанные change_counter. В транзакции строка блокируется
+    до её конца.
+    """
+    if not fields:
+        return
+    queryset = type(instance)._base_manager.filter(pk=instance.pk)
+    if transaction.get_connection(instance._state.db).in_atomic_block:
+        queryset = queryset.select_for_update()
+    values = queryset.values(*fields).first()
+    for field, value in (values or {}).items():
+        setattr(instance, field, value)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно меняет счётчик одним UPDATE с F()-выражением.
+    Уменьшение не опускает счётчик ниже нуля.
+    Внутри batch_counters изменение откладывается.
+    """
+    changes = pending_changes.get()
+    if changes is not None:
+        changes[model, field][pk] += delta
+        return
+    value = F(field) + delta
+    if delta < 0:
+        value = Greatest(value, 0)
+    model.objects.filter(pk=pk).update(**{field: value})
+
+
+def apply_counter_changes(model, field, deltas):
+    """Меняет счётчик field у нескольких объектов одним UPDATE."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    model.objects.filter(pk__in=deltas).update(**{field: Greatest(
+        F(field) + Case(
+            *(When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()),
+            default=Value(0),
+            output_field=IntegerField()
+        ),
+        0
+    )})
+
+
+@contextmanager
+def batch_counters():
+    """
+    Копит изменения счётчиков и применяет их по одному UPDATE на каждое
+    поле. Нужен при каскадном удалении: сигнал приходит для каждой
+    удаляемой строки, и без группировки число запросов растёт с данными.
+    """
+    if pending_changes.get() is not None:
+        yield
+        return
+    changes = defaultdict(Counter)
+    token = pending_changes.set(changes)
+    try:
+        yield
+    finally:
+        pending_changes.reset(token)
+    for (model, field), deltas in changes.items():
+        apply_counter_changes(model, field, deltas)
+
+
+def count_related(model, field):
+    """Подзапрос: число строк model, ссылающихся на объект через field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0
+    )
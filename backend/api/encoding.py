@@ -1,17 +1,48 @@
 import base64
+import binascii
+import string
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+
+
+def is_legacy_code(code):
+    """
+    Проверяет, что код — старая ссылка: Base64 от десятичной записи id.
+    """
+    if not code or len(code) % 4:
+        return False
+    try:
+        return base64.urlsafe_b64decode(code.encode()).decode().isdigit()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return False
 
 
 def encode_id(id):
     """
-    Кодирует целочисленный идентификатор в строку с использованием
-    безопасного для URL Base64.
+    Кодирует целочисленный идентификатор в короткую строку Base62.
+    Если код совпадает по виду со старой ссылкой Base64,
+    к нему добавляется ведущий ноль, не меняющий значения.
     """
-    return base64.urlsafe_b64encode(str(id).encode()).decode()
+    code = ''
+    while True:
+        id, remainder = divmod(id, BASE)
+        code = ALPHABET[remainder] + code
+        if not id:
+            break
+    if is_legacy_code(code):
+        code = ALPHABET[0] + code
+    return code
 
 
 def decode_id(encoded_id):
     """
-    Декодирует строку, закодированную в безопасный для URL
-    Base64, обратно в целочисленный идентификатор.
+    Декодирует короткую строку Base62 или старую ссылку
+    в безопасном для URL Base64 обратно в целочисленный идентификатор.
     """
-    return int(base64.urlsafe_b64decode(encoded_id.encode()).decode())
+    if is_legacy_code(encoded_id):
+        return int(base64.urlsafe_b64decode(encoded_id.encode()).decode())
+    id = 0
+    for char in encoded_id:
+        id = id * BASE + ALPHABET.index(char)
+    return id
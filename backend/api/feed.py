@@ -0,0 +1,230 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Recipe, Subscription
+
+User = get_user_model()
+
+TIMELINE_KEY = 'feed:{}'
+
+pending_changes = ContextVar('pending_timeline_changes', default=None)
+
+
+class BaseTimelineStorage(ABC):
+    """
+    Хранилище лент пользователей: списков id рецептов от новых к старым.
+    Лента — производные данные: если её нет в хранилище, она строится
+    заново из подписок, поэтому изменения применяются только
+    к уже существующим лентам.
+    """
+
+    @abstractmethod
+    def get(self, user_id):
+        """Возвращает ленту пользователя или None, если её нет."""
+
+    @abstractmethod
+    def get_many(self, user_ids):
+        """Возвращает словарь user_id -> лента для существующих лент."""
+
+    @abstractmethod
+    def set_many(self, timelines):
+        """Сохраняет ленты из словаря user_id -> список id рецептов."""
+
+    def set(self, user_id, recipe_ids):
+        self.set_many({user_id: recipe_ids})
+
+    def update(self, user_ids, change):
+        """Применяет change к существующим лентам пользователей."""
+        timelines = self.get_many(user_ids)
+        if timelines:
+            self.set_many({
+                user_id: change(timeline)
+                for user_id, timeline in timelines.items()
+            })
+
+    def push(self, user_ids, recipe_id):
+        """Добавляет новый рецепт в ленты подписчиков."""
+        self.update(user_ids, lambda timeline: merge_ids(timeline,
+                                                         [recipe_id]))
+
+    def discard(self, user_ids, recipe_ids):
+        """Убирает удалённые рецепты из лент подписчиков."""
+        recipe_ids = set(recipe_ids)
+        self.update(user_ids, lambda timeline: [
+            recipe_id for recipe_id in timeline
+            if recipe_id not in recipe_ids
+        ])
+
+
+class CacheTimelineStorage(BaseTimelineStorage):
+    """
+    Ленты в кэше Django (settings.FEED_CACHE).
+    Изменения не атомарны: при одновременной записи в одну ленту
+    изменение может потеряться, пока лента не истечёт
+    через settings.FEED_TIMEOUT и не будет построена заново.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.FEED_CACHE]
+
+    def get(self, user_id):
+        return self.cache.get(TIMELINE_KEY.format(user_id))
+
+    def get_many(self, user_ids):
+        keys = {TIMELINE_KEY.format(user_id): user_id for user_id in user_ids}
+        return {
+            keys[key]: timeline
+            for key, timeline in self.cache.get_many(list(keys)).items()
+        }
+
+    def set_many(self, timelines):
+        self.cache.set_many(
+            {
+                TIMELINE_KEY.format(user_id): list(recipe_ids)
+                for user_id, recipe_ids in timelines.items()
+            },
+            timeout=settings.FEED_TIMEOUT
+        )
+
+
+def get_timeline_storage():
+    """Возвращает хранилище лент, заданное в settings.FEED_STORAGE."""
+    return import_string(settings.FEED_STORAGE)()
+
+
+def merge_ids(timeline, recipe_ids):
+    """Объединяет id рецептов от новых к старым с ограничением длины."""
+    return sorted(set(timeline).union(recipe_ids),
+                  reverse=True)[:settings.FEED_MAX_LENGTH]
+
+
+def get_feed_recipes(user_id):
+    """Рецепты авторов, на которых подписан пользователь."""
+    return Recipe.objects.filter(author__following__user_id=user_id)
+
+
+def build_timeline(user_id):
+    """
+    Строит ленту пользователя из базы и сохраняет её.
+    Вызывается при первом чтении ленты и после подписки или отписки.
+    """
+    timeline = list(
+        get_feed_recipes(user_id).order_by('-id').values_list(
+            'id', flat=True)[:settings.FEED_MAX_LENGTH]
+    )
+    get_timeline_storage().set(user_id, timeline)
+    return timeline
+
+
+def get_feed_page(user, before, size, exclude=()):
+    """
+    Возвращает до size + 1 id рецептов ленты старше before, пропуская
+    id из exclude. Лишний id показывает, что есть следующая страница.
+    Лента хранит только последние рецепты, поэтому, когда она
+    заканчивается, продолжение читается из базы.
+    """
+    timeline = get_timeline_storage().get(user.id)
+    if timeline is None:
+        timeline = build_timeline(user.id)
+
+    page = [recipe_id for recipe_id in timeline
+            if (before is None or recipe_id < before)
+            and recipe_id not in exclude][:size + 1]
+    if len(page) <= size:
+        older_than = page[-1] if page else before
+        older = get_feed_recipes(user.id).order_by('-id')
+        if older_than is not None:
+            older = older.filter(id__lt=older_than)
+        page += older.values_list('id', flat=True)[:size + 1 - len(page)]
+    return page
+
+
+def push_recipe(author_id, recipe_id):
+    """Разносит новый рецепт по лентам подписчиков автора."""
+    get_timeline_storage().push(
+        Subscription.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True),
+        recipe_id
+    )
+
+
+def remove_recipes(author_id, recipe_ids):
+    """Убирает удалённые рецепты автора из лент его подписчиков."""
+    get_timeline_storage().discard(
+        Subscription.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True),
+        recipe_ids
+    )
+
+
+def rebuild_timelines(user_ids):
+    """Перестраивает ленты пользователей, которые ещё существуют."""
+    for user_id in User.objects.filter(id__in=user_ids).values_list(
+            'id', flat=True):
+        build_timeline(user_id)
+
+
+def remove_recipe_on_commit(author_id, recipe_id):
+    """
+    После фиксации транзакции убирает удалённый рецепт из лент
+    подписчиков. Внутри batch_timelines изменение откладывается.
+    """
+    changes = pending_changes.get()
+    if changes is not None:
+        changes['removed'][author_id].add(recipe_id)
+        return
+    transaction.on_commit(lambda: remove_recipes(author_id, [recipe_id]))
+
+
+def rebuild_timeline_on_commit(user_id):
+    """
+    После фиксации транзакции перестраивает ленту пользователя.
+    Внутри batch_timelines изменение откладывается.
+    """
+    changes = pending_changes.get()
+    if changes is not None:
+        changes['rebuild'].add(user_id)
+        return
+    transaction.on_commit(lambda: build_timeline(user_id))
+
+
+@contextmanager
+def batch_timelines():
+    """
+    Копит изменения лент и применяет их одним обработчиком после
+    фиксации. Нужен при каскадном удалении пользователя: сигнал приходит
+    для каждой подписки и каждого рецепта, и без группировки одна
+    и та же лента перестраивается много раз.
+    """
+    if pending_changes.get() is not None:
+        yield
+        return
+    changes = {'removed': defaultdict(set), 'rebuild': set()}
+    token = pending_changes.set(changes)
+    try:
+        yield
+    finally:
+        pending_changes.reset(token)
+
+    def apply():
+        for author_id, recipe_ids in changes['removed'].items():
+            remove_recipes(author_id, recipe_ids)
+        rebuild_timelines(changes['rebuild'])
+
+    if changes['removed'] or changes['rebuild']:
+        transaction.on_commit(apply)
+
+
+def discard_missing(user_id, recipe_ids):
+    """Убирает из ленты id рецептов, которых уже нет в базе."""
+    if recipe_ids:
+        get_timeline_storage().discard([user_id], recipe_ids)
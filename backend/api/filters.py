@@ -1,3 +1,7 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
 from django_filters import rest_framework as filters
 
 from .models import Ingredient, Recipe, Tag
@@ -15,8 +19,8 @@ class IngredientFilter(filters.FilterSet):
 
 class RecipeFilter(filters.FilterSet):
     """
-    Фильтр для рецептов по автору, тегам и состоянию
-    в избранном/списке покупок.
+    Фильтр для рецептов по автору, тегам, состоянию
+    в избранном/списке покупок и полнотекстовому поиску.
     """
     author = filters.NumberFilter(
         field_name='author__id', lookup_expr='exact'
@@ -33,10 +37,12 @@ class RecipeFilter(filters.FilterSet):
         to_field_name='slug',
         conjoined=False
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search']
 
     def filter_is_favorited(self, queryset, name, value):
         """
@@ -62,3 +68,22 @@ class RecipeFilter(filters.FilterSet):
         if value:
             return queryset.filter(in_shopping_cart__user=user)
         return queryset.exclude(in_shopping_cart__user=user)
+
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию и описанию рецепта.
+        Результаты упорядочены по релевантности, совпадения в названии
+        весят больше. Без PostgreSQL ищет подстроку без ранжирования.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            )
+        query = SearchQuery(value, config=settings.SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-id')
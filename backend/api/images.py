@@ -0,0 +1,136 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+from foodgram.storage import lock_file_name
+
+from .models import Recipe
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'renditions'
+
+executor = (
+    ThreadPoolExecutor(max_workers=settings.IMAGE_RENDITION_WORKERS,
+                       thread_name_prefix='image-renditions')
+    if settings.IMAGE_RENDITION_WORKERS else None
+)
+
+
+def get_file_name(instance, field):
+    """
+    Возвращает имя файла в поле модели или None, если поле отложено:
+    обращение к нему выполнило бы лишний запрос.
+    """
+    if field in instance.get_deferred_fields():
+        return None
+    return getattr(instance, field).name or ''
+
+
+def get_rendition_name(name, rendition):
+    """Возвращает путь к уменьшенной копии изображения в формате WebP."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, RENDITIONS_DIR,
+                        f'{stem}_{rendition}.webp')
+
+
+def get_rendition_urls(field_file):
+    """
+    Возвращает ссылки на уменьшенные копии изображения. Если копия
+    ещё не создана, вместо неё отдаётся ссылка на оригинал.
+    """
+    urls = {}
+    for rendition in settings.IMAGE_RENDITIONS:
+        rendition_name = get_rendition_name(field_file.name, rendition)
+        urls[rendition] = (default_storage.url(rendition_name)
+                           if default_storage.exists(rendition_name)
+                           else field_file.url)
+    return urls
+
+
+def generate_renditions(name):
+    """
+    Создаёт недостающие уменьшенные копии изображения.
+    Возвращает число созданных копий.
+    """
+    missing = {}
+    for rendition, size in settings.IMAGE_RENDITIONS.items():
+        rendition_name = get_rendition_name(name, rendition)
+        if not default_storage.exists(rendition_name):
+            missing[rendition_name] = size
+    if not missing:
+        return 0
+    try:
+        with default_storage.open(name, 'rb') as file:
+            image = Image.open(file)
+            image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        for rendition_name, size in missing.items():
+            resized = image.copy()
+            resized.thumbnail(size)
+            buffer = BytesIO()
+            resized.save(buffer, 'WEBP',
+                         quality=settings.IMAGE_RENDITION_QUALITY)
+            default_storage.save(rendition_name,
+                                 ContentFile(buffer.getvalue()))
+    except (UnidentifiedImageError, OSError):
+        logger.exception('Не удалось создать копии изображения %s', name)
+        return 0
+    return len(missing)
+
+
+def schedule_renditions(name):
+    """
+    Ставит создание уменьшенных копий в пул фоновых потоков
+    после фиксации транзакции, не задерживая ответ на запрос.
+    """
+    if not name:
+        return
+    if executor is None:
+        transaction.on_commit(lambda: generate_renditions(name))
+    else:
+        transaction.on_commit(
+            lambda: executor.submit(generate_renditions, name))
+
+
+def get_reference_count(name):
+    """Считает рецепты и пользователей, ссылающиеся на файл изображения."""
+    return (Recipe.objects.filter(image=name).count()
+            + User.objects.filter(avatar=name).count())
+
+
+def delete_unreferenced_image(name):
+    """
+    Удаляет файл и его копии, если на него больше никто не ссылается.
+    Проверка ссылок и удаление идут под блокировкой имени файла,
+    которую берёт и сохранение того же файла.
+    """
+    with transaction.atomic():
+        lock_file_name(name)
+        if get_reference_count(name):
+            return
+        for rendition in settings.IMAGE_RENDITIONS:
+            default_storage.delete(get_rendition_name(name, rendition))
+        default_storage.delete(name)
+
+
+def release_image(name):
+    """
+    Освобождает ссылку на изображение после фиксации транзакции.
+    Одинаковые файлы хранятся один раз, поэтому файл удаляется,
+    только когда на него не осталось ссылок.
+    """
+    if name:
+        transaction.on_commit(lambda: delete_unreferenced_image(name))
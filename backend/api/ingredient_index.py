@@ -0,0 +1,67 @@
+import threading
+from bisect import bisect_left
+
+from .cache import get_reference_data_version
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """
+    Индекс названий ингредиентов в памяти процесса для автодополнения.
+    Строится при первом обращении и перестраивается,
+    когда меняется версия справочников.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+
+    def _build(self):
+        entries = sorted(
+            (
+                {'id': id, 'name': name, 'measurement_unit': unit}
+                for id, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit').iterator()
+            ),
+            key=lambda entry: (entry['name'].lower(), entry['id'])
+        )
+        keys = [entry['name'].lower() for entry in entries]
+        return keys, entries
+
+    def _get_snapshot(self):
+        version = get_reference_data_version()
+        if self._version == version:
+            return self._snapshot
+        with self._lock:
+            if self._version != version:
+                self._snapshot = self._build()
+                self._version = version
+            return self._snapshot
+
+    def all(self):
+        """Возвращает все ингредиенты в алфавитном порядке."""
+        return self._get_snapshot()[1]
+
+    def search(self, query, limit):
+        """
+        Возвращает до limit ингредиентов: сначала те, чьё название
+        начинается с query, затем содержащие query в середине.
+        """
+        keys, entries = self._get_snapshot()
+        query = query.lower()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = entries[start:min(end, start + limit)]
+
+        for key, entry in zip(keys, entries):
+            if len(result) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                result.append(entry)
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from api.images import generate_renditions
+from api.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Create missing WebP renditions of recipe images and avatars'
+
+    def handle(self, *args, **kwargs):
+        names = set(
+            Recipe.objects.exclude(image='').exclude(image__isnull=True)
+            .values_list('image', flat=True)
+        )
+        names.update(
+            User.objects.exclude(avatar='').exclude(avatar__isnull=True)
+            .values_list('avatar', flat=True)
+        )
+
+        created = 0
+        for name in sorted(names):
+            created += generate_renditions(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} renditions for {len(names)} images'
+        ))
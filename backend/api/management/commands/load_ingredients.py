@@ -1,20 +1,103 @@
-import os
+import csv
 import json
+import os
+import time
+from itertools import islice
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
+from api.cache import bump_reference_data_version
 from api.models import Ingredient
 
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Построчно читает ингредиенты из CSV вида "название,единица"."""
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_ndjson(file):
+    """Читает ингредиенты из файла, где каждая строка — JSON-объект."""
+    for line in file:
+        line = line.strip()
+        if line:
+            item = json.loads(line)
+            yield item['name'], item['measurement_unit']
+
+
+def read_json_array(file):
+    """
+    Потоково читает ингредиенты из JSON-массива объектов,
+    не загружая весь файл в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer, position = file.read(CHUNK_SIZE), 0
+            eof = not buffer
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        position = end
+        yield item['name'], item['measurement_unit']
+
+
+def read_json(file):
+    """Определяет вид JSON-файла (массив или NDJSON) по первому символу."""
+    first = file.read(1)
+    while first.isspace():
+        first = file.read(1)
+    file.seek(0)
+    if first == '[':
+        return read_json_array(file)
+    return read_ndjson(file)
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'ndjson': read_ndjson,
+    'jsonl': read_ndjson,
+}
+
 
 class Command(BaseCommand):
-    help = 'Load ingredients from JSON file into the database'
+    help = 'Load ingredients from a CSV, JSON or NDJSON file into the database'
 
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path',
             type=str,
-            help='The path to the JSON file containing ingredients'
+            help='The path to the file containing ingredients'
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='File format, detected from the extension by default'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of ingredients inserted per query'
         )
 
     @transaction.atomic
@@ -25,24 +108,55 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'{file_path} not found'))
             return
 
+        file_format = (kwargs['format']
+                       or os.path.splitext(file_path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            self.stdout.write(self.style.ERROR(
+                f'Unsupported file format: {file_format}'
+            ))
+            return
+
+        if kwargs['batch_size'] < 1:
+            self.stdout.write(self.style.ERROR(
+                '--batch-size must be a positive integer'
+            ))
+            return
+
         try:
-            if os.path.exists(file_path):
-                self.load_ingredients(file_path)
-            else:
-                self.stdout.write(self.style.WARNING(
-                    f'{file_path} not found'
-                ))
-
-            self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+            started = time.monotonic()
+            total, inserted = self.load_ingredients(
+                file_path, READERS[file_format], kwargs['batch_size']
+            )
+            elapsed = time.monotonic() - started
+
+            self.stdout.write(self.style.SUCCESS(
+                f'Data imported successfully: {inserted} inserted, '
+                f'{total - inserted} skipped in {elapsed:.2f}s '
+                f'({total / max(elapsed, 1e-6):.0f} rows/s)'
+            ))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error importing data: {e}'))
             transaction.set_rollback(True)
 
-    def load_ingredients(self, file_path):
-        with open(file_path, 'r', encoding='utf-8') as jsonfile:
-            data = json.load(jsonfile)
-            for item in data:
-                Ingredient.objects.get_or_create(
-                    name=item['name'],
-                    measurement_unit=item['measurement_unit']
-                )
+    def load_ingredients(self, file_path, reader, batch_size):
+        """
+        Загружает ингредиенты пачками через bulk_create, пропуская уже
+        существующие. Возвращает число прочитанных и добавленных записей.
+        """
+        count_before = Ingredient.objects.count()
+        total = 0
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            rows = reader(file)
+            while True:
+                batch = [
+                    Ingredient(name=name.strip(),
+                               measurement_unit=unit.strip())
+                    for name, unit in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+
+        transaction.on_commit(bump_reference_data_version)
+        return total, Ingredient.objects.count() - count_before
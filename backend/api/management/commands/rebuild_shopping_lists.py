@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.models import RecipeIngredient, ShoppingCart, ShoppingCartIngredient
+from api.shopping_list import calculate_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify stored shopping list totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare stored totals with recalculated ones'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows inserted per query'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **kwargs):
+        self.lock_tables()
+        expected = calculate_shopping_lists()
+
+        if kwargs['verify']:
+            self.verify(expected)
+        else:
+            self.rebuild(expected, kwargs['batch_size'])
+
+    def lock_tables(self):
+        """
+        Блокирует корзины, ингредиенты рецептов и итоги до конца
+        транзакции: чтение не мешает, а изменения ждут, поэтому итоги
+        считаются и записываются по одному состоянию корзин.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        tables = ', '.join(
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (ShoppingCart, RecipeIngredient,
+                          ShoppingCartIngredient)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE')
+
+    def verify(self, expected):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in (
+                ShoppingCartIngredient.objects
+                .values_list('user_id', 'ingredient_id', 'amount')
+                .iterator()
+            )
+        }
+        mismatched = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in sorted(mismatched):
+            self.stdout.write(self.style.WARNING(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'stored {stored.get((user_id, ingredient_id))}, '
+                f'expected {expected.get((user_id, ingredient_id))}'
+            ))
+
+        if mismatched:
+            self.stdout.write(self.style.ERROR(
+                f'{len(mismatched)} shopping list totals are out of date'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Shopping list totals are up to date'
+            ))
+
+    def rebuild(self, expected, batch_size):
+        ShoppingCartIngredient.objects.all().delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            (
+                ShoppingCartIngredient(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=amount
+                )
+                for (user_id, ingredient_id), amount in expected.items()
+            ),
+            batch_size=batch_size
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(expected)} shopping list totals'
+        ))
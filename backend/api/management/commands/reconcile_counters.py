@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from api.counters import count_related
+from api.models import Favorite, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+    (User, 'following_count', Subscription, 'user'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Verify or repair denormalized recipe and user counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report counters that differ from recalculated ones'
+        )
+
+    def handle(self, *args, **kwargs):
+        drifted = 0
+        for model, field, related_model, related_field in COUNTERS:
+            drifted += self.reconcile(model, field, related_model,
+                                      related_field, kwargs['verify'])
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Counters are up to date'))
+        elif kwargs['verify']:
+            self.stdout.write(self.style.ERROR(
+                f'{drifted} counters are out of date'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Repaired {drifted} counters'
+            ))
+
+    @transaction.atomic
+    def reconcile(self, model, field, related_model, related_field, verify):
+        """
+        Сравнивает счётчик с пересчитанным значением и, если не задан
+        verify, исправляет расхождения одним UPDATE.
+        """
+        drifted = model.objects.annotate(
+            expected=count_related(related_model, related_field)
+        ).exclude(**{field: F('expected')})
+        rows = list(drifted.values_list('pk', field, 'expected'))
+
+        for pk, stored, expected in rows:
+            self.stdout.write(self.style.WARNING(
+                f'{model._meta.model_name} {pk} {field}: '
+                f'stored {stored}, expected {expected}'
+            ))
+        if rows and not verify:
+            model.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(
+                **{field: count_related(related_model, related_field)}
+            )
+        return len(rows)
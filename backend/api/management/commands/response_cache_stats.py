@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import CACHED_RESPONSES
+from api.metrics import RESPONSE_CACHE_RESULTS, registry
+
+
+class Command(BaseCommand):
+    help = ('Show hit and miss counts of the anonymous response cache '
+            'collected by all processes in METRICS_DIR')
+
+    def handle(self, *args, **kwargs):
+        _, response_cache = registry.collect()
+        for name in CACHED_RESPONSES:
+            stats = response_cache.get(
+                name, dict.fromkeys(RESPONSE_CACHE_RESULTS, 0)
+            )
+            total = stats['hits'] + stats['misses']
+            hit_rate = stats['hits'] / total if total else 0
+            self.stdout.write(
+                f'{name}: {stats["hits"]} hits, {stats["misses"]} misses, '
+                f'hit rate {hit_rate:.1%}'
+            )
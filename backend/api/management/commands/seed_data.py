@@ -0,0 +1,346 @@
+import random
+import time
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api.cache import bump_reference_data_version, invalidate_recipe_responses
+from api.counters import count_related
+from api.management.commands.reconcile_counters import COUNTERS
+from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                        ShoppingCart, ShoppingCartIngredient, Subscription,
+                        Tag)
+
+User = get_user_model()
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+DISHES = ('Салат', 'Суп', 'Запеканка', 'Пирог', 'Рагу', 'Омлет', 'Паста',
+          'Каша', 'Соус', 'Десерт')
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r',
+})
+
+
+class ZipfSampler:
+    """
+    Выбирает элементы с вероятностью, обратно пропорциональной рангу
+    в степени exponent. Ранги раздаются в случайном порядке, чтобы
+    популярность не зависела от id.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+        self.rng = rng
+
+    def sample(self, count):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights,
+                                k=count)
+
+    def sample_distinct(self, count, exclude=None):
+        """Выбирает count разных элементов, кроме exclude."""
+        available = len(self.items) - (exclude is not None)
+        count = min(count, available)
+        if count > available // 2:
+            items = [item for item in self.items if item != exclude]
+            return self.rng.sample(items, count)
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.sample(count - len(chosen)))
+            chosen.discard(exclude)
+        return list(chosen)
+
+
+def format_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).translate(COPY_ESCAPES)
+
+
+class CopyStream:
+    """
+    Файлоподобный объект для cursor.copy_expert: формирует строки
+    в текстовом формате COPY по мере чтения и считает их.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.count += 1
+            self.buffer += '\t'.join(map(format_copy_value, row)) + '\n'
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    readline = read
+
+
+class Command(BaseCommand):
+    help = ('Generate deterministic load-testing data and write it '
+            'with PostgreSQL COPY')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Number of users to create')
+        parser.add_argument('--recipes', type=int, default=10000,
+                            help='Number of recipes to create')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8,
+                            help='Average number of ingredients in a recipe')
+        parser.add_argument('--tags-per-recipe', type=int, default=2,
+                            help='Maximum number of tags in a recipe')
+        parser.add_argument('--subscriptions', type=int, default=20,
+                            help='Average number of subscriptions per user')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Average number of favorites per user')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Average number of cart recipes per user')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Exponent of the popularity distribution')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed')
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Rows written per COPY statement')
+        parser.add_argument('--ingredients-file',
+                            default='data/ingredients.csv',
+                            help='Ingredient catalogue loaded when the '
+                                 'ingredient table is empty')
+        parser.add_argument('--password', default='seed-password',
+                            help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('seed_data writes with COPY and needs '
+                               'PostgreSQL')
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('At least two users and one recipe '
+                               'are required')
+        self.options = options
+        self.now = timezone.now()
+        self.total_rows = 0
+        started = time.monotonic()
+
+        ingredient_ids = self.get_ingredient_ids()
+        tag_ids = self.get_tag_ids()
+        ingredient_names = dict(
+            Ingredient.objects.filter(id__in=ingredient_ids)
+            .values_list('id', 'name')
+        )
+
+        user_ids = self.reserve_ids(User, options['users'])
+        recipe_ids = self.reserve_ids(Recipe, options['recipes'])
+        authors = ZipfSampler(user_ids, options['zipf'],
+                              self.get_rng('authors'))
+        recipe_authors = authors.sample(len(recipe_ids))
+        ingredients = ZipfSampler(ingredient_ids, options['zipf'],
+                                  self.get_rng('ingredients'))
+
+        self.copy(User, ('id', 'password', 'is_superuser', 'username',
+                         'first_name', 'last_name', 'email', 'is_staff',
+                         'is_active', 'date_joined', 'recipes_count',
+                         'followers_count', 'following_count'),
+                  self.generate_users(user_ids))
+        self.copy(Recipe, ('id', 'author', 'name', 'text', 'cooking_time',
+                           'favorites_count', 'shopping_cart_count',
+                           'cache_generation'),
+                  self.generate_recipes(recipe_ids, recipe_authors,
+                                        ingredients, ingredient_names))
+        self.copy(Recipe.tags.through, ('recipe', 'tag'),
+                  self.generate_recipe_tags(recipe_ids, tag_ids))
+        self.copy(RecipeIngredient, ('recipe', 'ingredient', 'amount'),
+                  self.generate_recipe_ingredients(recipe_ids, ingredients))
+        self.copy(Subscription, ('user', 'author', 'created_at'),
+                  self.generate_subscriptions(user_ids, authors))
+        recipes = ZipfSampler(recipe_ids, options['zipf'],
+                              self.get_rng('recipes'))
+        self.copy(Favorite, ('user', 'recipe'),
+                  self.generate_choices(user_ids, recipes, 'favorites'))
+        self.copy(ShoppingCart, ('user', 'recipe'),
+                  self.generate_choices(user_ids, recipes, 'cart'))
+
+        self.update_derived_data(user_ids, recipe_ids)
+        self.reset_sequences()
+        invalidate_recipe_responses()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {self.total_rows} rows in {elapsed:.1f}s '
+            f'({self.total_rows / max(elapsed, 1e-6):.0f} rows/s)'
+        ))
+
+    def get_rng(self, name):
+        """Отдельный генератор для каждой таблицы: данные не зависят от
+        порядка генерации и от размеров других таблиц."""
+        return random.Random(f'{self.options["seed"]}:{name}')
+
+    def get_average_count(self, rng, average):
+        """Число связей у объекта: в среднем average, с длинным хвостом."""
+        if average <= 0:
+            return 0
+        return int(rng.expovariate(1 / average))
+
+    def get_ingredient_ids(self):
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', self.options['ingredients_file'],
+                         stdout=self.stdout)
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('The ingredient catalogue is empty')
+        return ingredient_ids
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(Tag(name=name, slug=slug)
+                                    for name, slug in DEFAULT_TAGS)
+            transaction.on_commit(bump_reference_data_version)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def reserve_ids(self, model, count):
+        """
+        Id новых строк идут сразу за наибольшим существующим: связи
+        генерируются до записи, а последовательность сдвигается в конце.
+        """
+        start = (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        return range(start, start + count)
+
+    def copy(self, model, fields, rows):
+        """
+        Записывает строки в таблицу модели командами COPY по batch_size
+        строк, каждая пачка в своей транзакции.
+        """
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        sql = (f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+               f'({columns}) FROM STDIN')
+        rows = iter(rows)
+        count = 0
+        started = time.monotonic()
+        while True:
+            stream = CopyStream(islice(rows, self.options['batch_size']))
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.copy_expert(sql, stream)
+            if not stream.count:
+                break
+            count += stream.count
+        self.report(model._meta.db_table, count, time.monotonic() - started)
+
+    def report(self, name, count, elapsed):
+        self.total_rows += count
+        self.stdout.write(
+            f'{name}: {count} rows in {elapsed:.1f}s '
+            f'({count / max(elapsed, 1e-6):.0f} rows/s)'
+        )
+
+    def generate_users(self, user_ids):
+        password = make_password(self.options['password'])
+        for user_id in user_ids:
+            yield (user_id, password, False, f'seed{user_id}', 'Имя',
+                   'Фамилия', f'seed{user_id}@example.com', False, True,
+                   self.now, 0, 0, 0)
+
+    def generate_recipes(self, recipe_ids, recipe_authors, ingredients,
+                         ingredient_names):
+        rng = self.get_rng('recipe-text')
+        for recipe_id, author_id in zip(recipe_ids, recipe_authors):
+            main, *others = [ingredient_names[ingredient_id] for
+                             ingredient_id in ingredients.sample(3)]
+            yield (recipe_id, author_id, f'{rng.choice(DISHES)} «{main}»',
+                   f'Смешайте {main}, {others[0]} и {others[1]}.',
+                   rng.randint(5, 180), 0, 0, 0)
+
+    def generate_recipe_tags(self, recipe_ids, tag_ids):
+        rng = self.get_rng('recipe-tags')
+        for recipe_id in recipe_ids:
+            count = rng.randint(1, min(self.options['tags_per_recipe'],
+                                       len(tag_ids)))
+            for tag_id in rng.sample(tag_ids, count):
+                yield recipe_id, tag_id
+
+    def generate_recipe_ingredients(self, recipe_ids, ingredients):
+        rng = self.get_rng('recipe-ingredients')
+        average = self.options['ingredients_per_recipe']
+        for recipe_id in recipe_ids:
+            count = max(1, rng.randint(average // 2, average * 3 // 2))
+            for ingredient_id in ingredients.sample_distinct(count):
+                yield recipe_id, ingredient_id, rng.randint(1, 500)
+
+    def generate_subscriptions(self, user_ids, authors):
+        rng = self.get_rng('subscriptions')
+        for user_id in user_ids:
+            count = self.get_average_count(rng,
+                                           self.options['subscriptions'])
+            for author_id in authors.sample_distinct(count, exclude=user_id):
+                yield user_id, author_id, self.now
+
+    def generate_choices(self, user_ids, recipes, name):
+        """Избранное или корзина: популярные рецепты выбирают чаще."""
+        rng = self.get_rng(name)
+        for user_id in user_ids:
+            count = self.get_average_count(rng, self.options[name])
+            for recipe_id in recipes.sample_distinct(count):
+                yield user_id, recipe_id
+
+    @transaction.atomic
+    def update_derived_data(self, user_ids, recipe_ids):
+        """
+        Считает счётчики и итоги списков покупок созданных пользователей
+        и рецептов запросами на стороне базы.
+        """
+        started = time.monotonic()
+        seeded = {User: user_ids, Recipe: recipe_ids}
+        for model, field, related_model, related_field in COUNTERS:
+            ids = seeded[model]
+            model.objects.filter(id__range=(ids[0], ids[-1])).update(
+                **{field: count_related(related_model, related_field)}
+            )
+        self.report('counters', 0, time.monotonic() - started)
+
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {ShoppingCartIngredient._meta.db_table} '
+                f'(user_id, ingredient_id, amount) '
+                f'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+                f'FROM {ShoppingCart._meta.db_table} cart '
+                f'JOIN {RecipeIngredient._meta.db_table} item '
+                f'ON item.recipe_id = cart.recipe_id '
+                f'WHERE cart.user_id BETWEEN %s AND %s '
+                f'GROUP BY cart.user_id, item.ingredient_id',
+                [user_ids[0], user_ids[-1]]
+            )
+            count = cursor.rowcount
+        self.report(ShoppingCartIngredient._meta.db_table, count,
+                    time.monotonic() - started)
+
+    def reset_sequences(self):
+        """Сдвигает последовательности id за записанные вручную id."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(),
+                                                         [User, Recipe]):
+                cursor.execute(sql)
+            cursor.execute('ANALYZE')
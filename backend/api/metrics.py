@@ -0,0 +1,351 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                     1.0, 2.5, 5.0, 10.0)
+RESPONSE_CACHE_RESULTS = ('hits', 'misses')
+
+serializer_depth = ContextVar('serializer_depth', default=0)
+request_stats = ContextVar('request_stats', default=None)
+timed_serializer_classes = {}
+
+
+class RequestStats:
+    """Показатели одного запроса: SQL-запросы и время сериализации."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper, считающая SQL-запросы."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+
+def new_route_metrics():
+    return {
+        'count': 0,
+        'sum': 0.0,
+        'buckets': [0] * len(HISTOGRAM_BUCKETS),
+        'queries': 0,
+        'query_seconds': 0.0,
+        'serializer_seconds': 0.0,
+        'statuses': {},
+    }
+
+
+def merge_route_metrics(target, source):
+    for key in ('count', 'sum', 'queries', 'query_seconds',
+                'serializer_seconds'):
+        target[key] += source[key]
+    target['buckets'] = [
+        a + b for a, b in zip(target['buckets'], source['buckets'])
+    ]
+    for status, count in source['statuses'].items():
+        target['statuses'][status] = target['statuses'].get(status, 0) + count
+
+
+def merge_snapshot(routes, response_cache, snapshot):
+    """Добавляет снимок метрик процесса к суммам routes и response_cache."""
+    for route, method, metrics in snapshot['routes']:
+        merge_route_metrics(
+            routes.setdefault((route, method), new_route_metrics()),
+            metrics
+        )
+    for view, results in snapshot['response_cache'].items():
+        target = response_cache.setdefault(
+            view, dict.fromkeys(RESPONSE_CACHE_RESULTS, 0)
+        )
+        for result in RESPONSE_CACHE_RESULTS:
+            target[result] += results.get(result, 0)
+
+
+def read_snapshot(path):
+    """Читает снимок из файла или возвращает None, если это не удалось."""
+    try:
+        with open(path) as file:
+            snapshot = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return snapshot if isinstance(snapshot, dict) else None
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    Метрики запросов в памяти процесса, сгруппированные по маршруту
+    и методу, и попадания в кэш ответов. Каждый процесс gunicorn
+    периодически сохраняет свой снимок в отдельный файл
+    в settings.METRICS_DIR, а экспорт суммирует все файлы,
+    поэтому процессы не пишут в общие данные.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._response_cache = {}
+        self._flushed_at = 0.0
+
+    def observe(self, route, method, status, duration, stats):
+        with self._lock:
+            metrics = self._routes.setdefault((route, method),
+                                              new_route_metrics())
+            metrics['count'] += 1
+            metrics['sum'] += duration
+            for index, bound in enumerate(HISTOGRAM_BUCKETS):
+                if duration <= bound:
+                    metrics['buckets'][index] += 1
+            metrics['queries'] += stats.queries
+            metrics['query_seconds'] += stats.query_seconds
+            metrics['serializer_seconds'] += stats.serializer_seconds
+            status = str(status)
+            metrics['statuses'][status] = (
+                metrics['statuses'].get(status, 0) + 1
+            )
+        self.flush_if_due()
+
+    def count_response_cache(self, view, hit):
+        """Учитывает попадание или промах кэша ответов представления."""
+        result = 'hits' if hit else 'misses'
+        with self._lock:
+            results = self._response_cache.setdefault(
+                view, dict.fromkeys(RESPONSE_CACHE_RESULTS, 0)
+            )
+            results[result] += 1
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        flush_interval = settings.METRICS_FLUSH_INTERVAL
+        if time.monotonic() - self._flushed_at >= flush_interval:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'routes': [
+                    [route, method, json.loads(json.dumps(metrics))]
+                    for (route, method), metrics in self._routes.items()
+                ],
+                'response_cache': {
+                    view: dict(results)
+                    for view, results in self._response_cache.items()
+                },
+            }
+
+    def get_path(self):
+        return os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+
+    def flush(self):
+        """Атомарно записывает снимок метрик процесса в его файл."""
+        self._flushed_at = time.monotonic()
+        if not settings.METRICS_DIR or not (self._routes
+                                            or self._response_cache):
+            return
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self.get_path()
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temp_path, path)
+
+    def collect(self):
+        """
+        Суммирует метрики всех процессов. Возвращает метрики маршрутов
+        и словарь view -> {'hits': ..., 'misses': ...} кэша ответов.
+        """
+        if settings.METRICS_DIR:
+            self.absorb_finished_processes()
+            self.flush()
+            snapshots = [
+                read_snapshot(os.path.join(settings.METRICS_DIR, name))
+                for name in os.listdir(settings.METRICS_DIR)
+                if name.endswith('.json')
+            ]
+        else:
+            snapshots = [self.snapshot()]
+
+        routes = {}
+        response_cache = {}
+        for snapshot in snapshots:
+            if snapshot is not None:
+                merge_snapshot(routes, response_cache, snapshot)
+        return routes, response_cache
+
+    def absorb_finished_processes(self):
+        """
+        Переносит снимки завершившихся процессов в метрики текущего
+        и удаляет их файлы: каталог не растёт с перезапусками, а суммы
+        счётчиков не уменьшаются. Файл сначала переименовывается
+        в имя с pid текущего процесса, поэтому снимок забирает только
+        один процесс. Прочие файлы завершившихся процессов (временные
+        и недоразобранные) удаляются.
+        """
+        for name in os.listdir(settings.METRICS_DIR):
+            pid = name.split('.', 1)[0]
+            if not pid.isdigit() or is_process_alive(int(pid)):
+                continue
+            path = os.path.join(settings.METRICS_DIR, name)
+            if not name.endswith('.json'):
+                remove_file(path)
+                continue
+            claimed_path = os.path.join(settings.METRICS_DIR,
+                                        f'{os.getpid()}.absorbing.{name}')
+            try:
+                os.rename(path, claimed_path)
+            except OSError:
+                continue
+            snapshot = read_snapshot(claimed_path)
+            if snapshot is not None:
+                with self._lock:
+                    merge_snapshot(self._routes, self._response_cache,
+                                   snapshot)
+                self.flush()
+            remove_file(claimed_path)
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush)
+
+
+@contextmanager
+def time_serialization():
+    """
+    Учитывает время сериализации в показателях текущего запроса.
+    Вложенные сериализаторы не учитываются повторно.
+    """
+    stats = request_stats.get()
+    depth = serializer_depth.get()
+    if stats is None or depth:
+        yield
+        return
+    token = serializer_depth.set(depth + 1)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_seconds += time.perf_counter() - started
+        serializer_depth.reset(token)
+
+
+@contextmanager
+def track_queries(stats):
+    """Учитывает в stats SQL-запросы всех подключений текущего потока."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield
+
+
+def get_timed_serializer_class(serializer_class):
+    """
+    Подкласс сериализатора, учитывающий время to_representation
+    в показателях текущего запроса. Создаётся один раз на класс;
+    у списка (many=True) учитывается каждый элемент.
+    """
+    timed_class = timed_serializer_classes.get(serializer_class)
+    if timed_class is not None:
+        return timed_class
+
+    def to_representation(self, instance):
+        with time_serialization():
+            return super(timed_class, self).to_representation(instance)
+
+    timed_class = type(serializer_class.__name__, (serializer_class,), {
+        '__module__': serializer_class.__module__,
+        '__qualname__': serializer_class.__qualname__,
+        'to_representation': to_representation,
+    })
+    return timed_serializer_classes.setdefault(serializer_class, timed_class)
+
+
+def escape_label(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(**labels):
+    return ','.join(f'{name}="{escape_label(value)}"'
+                    for name, value in labels.items())
+
+
+def render_metrics(routes, response_cache_stats=None):
+    """Формирует метрики в текстовом формате Prometheus."""
+    lines = [
+        '# HELP foodgram_http_request_duration_seconds Request latency.',
+        '# TYPE foodgram_http_request_duration_seconds histogram',
+    ]
+    for (route, method), metrics in sorted(routes.items()):
+        labels = format_labels(route=route, method=method)
+        for bound, count in zip(HISTOGRAM_BUCKETS, metrics['buckets']):
+            lines.append(
+                f'foodgram_http_request_duration_seconds_bucket'
+                f'{{{labels},le="{bound}"}} {count}'
+            )
+        lines += [
+            f'foodgram_http_request_duration_seconds_bucket'
+            f'{{{labels},le="+Inf"}} {metrics["count"]}',
+            f'foodgram_http_request_duration_seconds_sum{{{labels}}} '
+            f'{metrics["sum"]}',
+            f'foodgram_http_request_duration_seconds_count{{{labels}}} '
+            f'{metrics["count"]}',
+        ]
+
+    counters = (
+        ('foodgram_http_responses_total', 'Responses by status code.', None),
+        ('foodgram_db_queries_total', 'SQL queries executed.', 'queries'),
+        ('foodgram_db_query_duration_seconds_total',
+         'Time spent executing SQL queries.', 'query_seconds'),
+        ('foodgram_serializer_duration_seconds_total',
+         'Time spent in top-level serializers.', 'serializer_seconds'),
+    )
+    for name, help_text, key in counters:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (route, method), metrics in sorted(routes.items()):
+            if key is not None:
+                labels = format_labels(route=route, method=method)
+                lines.append(f'{name}{{{labels}}} {metrics[key]}')
+                continue
+            for status, count in sorted(metrics['statuses'].items()):
+                labels = format_labels(route=route, method=method,
+                                       status=status)
+                lines.append(f'{name}{{{labels}}} {count}')
+
+    if response_cache_stats:
+        name = 'foodgram_response_cache_requests_total'
+        lines += [f'# HELP {name} Anonymous response cache lookups.',
+                  f'# TYPE {name} counter']
+        for view, results in sorted(response_cache_stats.items()):
+            for result, count in sorted(results.items()):
+                labels = format_labels(view=view, result=result)
+                lines.append(f'{name}{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import RequestStats, registry, request_stats, track_queries
+
+
+def get_route(request):
+    """Имя маршрута запроса, а не сам путь, чтобы число меток было конечным."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def observe(request, response, started, stats):
+    registry.observe(get_route(request), request.method,
+                     response.status_code,
+                     time.perf_counter() - started, stats)
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Записывает для каждого маршрута и метода время ответа, число и время
+    SQL-запросов и время сериализации.
+    Работает и под WSGI, и под ASGI. В асинхронном режиме SQL-запросы
+    выполняются в других потоках, поэтому их учитывают асинхронные
+    представления (см. api.async_views) через request_stats.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not settings.METRICS_ENABLED:
+                return await get_response(request)
+
+            stats = RequestStats()
+            token = request_stats.set(stats)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                request_stats.reset(token)
+            observe(request, response, started, stats)
+            return response
+    else:
+        def middleware(request):
+            if not settings.METRICS_ENABLED:
+                return get_response(request)
+
+            stats = RequestStats()
+            token = request_stats.set(stats)
+            started = time.perf_counter()
+            try:
+                with track_queries(stats):
+                    response = get_response(request)
+            finally:
+                request_stats.reset(token)
+            observe(request, response, started, stats)
+            return response
+
+    return middleware
@@ -0,0 +1,71 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+# Значение settings.MAX_AMOUNT на момент миграции.
+MAX_AMOUNT = 32_000
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Перед добавлением уникальности сливает ингредиенты с одинаковыми
+    названием и единицей измерения, перенося на оставшийся рецепты
+    и списки покупок. Если рецепт уже содержит оставшийся ингредиент,
+    количества складываются в одну строку.
+    """
+    Ingredient = apps.get_model('api', 'Ingredient')
+    RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model('api', 'ShoppingCartIngredient')
+    kept = {}
+    for ingredient in Ingredient.objects.order_by('id'):
+        key = (ingredient.name, ingredient.measurement_unit)
+        if key not in kept:
+            kept[key] = ingredient
+            continue
+        target = kept[key]
+        for item in RecipeIngredient.objects.filter(ingredient=ingredient):
+            existing = RecipeIngredient.objects.filter(
+                recipe_id=item.recipe_id, ingredient=target
+            ).first()
+            if existing is None:
+                item.ingredient = target
+                item.save(update_fields=['ingredient'])
+            else:
+                existing.amount = min(existing.amount + item.amount,
+                                      MAX_AMOUNT)
+                existing.save(update_fields=['amount'])
+                item.delete()
+        for item in ShoppingCartIngredient.objects.filter(
+            ingredient=ingredient
+        ):
+            existing = ShoppingCartIngredient.objects.filter(
+                user_id=item.user_id, ingredient=target
+            ).first()
+            if existing is None:
+                item.ingredient = target
+                item.save(update_fields=['ingredient'])
+            else:
+                existing.amount += item.amount
+                existing.save(update_fields=['amount'])
+                item.delete()
+        ingredient.delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей должны отработать до ALTER TABLE
+        # в той же транзакции.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
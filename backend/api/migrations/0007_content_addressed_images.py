@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:30
+
+import foodgram.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_ingredient_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=foodgram.storage.ContentAddressedStorage(), upload_to='content/', verbose_name='Ссылка на картинку на сайте'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:34
+
+from django.db import migrations
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Перед добавлением уникальности сливает теги с одинаковым слагом."""
+    Tag = apps.get_model('api', 'Tag')
+    Recipe = apps.get_model('api', 'Recipe')
+    kept = {}
+    for tag in Tag.objects.order_by('id'):
+        if tag.slug not in kept:
+            kept[tag.slug] = tag
+            continue
+        for recipe in Recipe.objects.filter(tags=tag):
+            recipe.tags.add(kept[tag.slug])
+        tag.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:34
+
+from django.db import migrations, models
+
+INGREDIENT_NAME_INDEX = 'ingredient_name_prefix_idx'
+
+
+def create_ingredient_name_index(apps, schema_editor):
+    """
+    Индекс для поиска ингредиента по началу названия без учёта регистра:
+    istartswith в PostgreSQL сравнивает UPPER(name) через LIKE.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+        f'ON api_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+
+
+def drop_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_merge_duplicate_tags'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(max_length=32, unique=True, verbose_name='Слаг'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe'], include=('user',), name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeingredient',
+            index=models.Index(fields=['recipe', 'ingredient'], include=('amount',), name='recipe_ingredient_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe'], include=('user',), name='shopping_cart_recipe_user_idx'),
+        ),
+        migrations.RunPython(
+            create_ingredient_name_index, drop_ingredient_name_index
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:37
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+CREATE_SEARCH_VECTOR = '''
+CREATE OR REPLACE FUNCTION api_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON api_recipe
+    FOR EACH ROW EXECUTE PROCEDURE api_recipe_search_vector_update();
+
+UPDATE api_recipe SET name = name;
+
+CREATE INDEX IF NOT EXISTS recipe_search_vector_idx
+    ON api_recipe USING gin (search_vector);
+'''
+
+DROP_SEARCH_VECTOR = '''
+DROP INDEX IF EXISTS recipe_search_vector_idx;
+DROP TRIGGER IF EXISTS api_recipe_search_vector_trigger ON api_recipe;
+DROP FUNCTION IF EXISTS api_recipe_search_vector_update();
+'''
+
+
+def create_search_vector(apps, schema_editor):
+    """
+    Поисковый вектор по названию и описанию поддерживается триггером
+    в PostgreSQL и индексируется GIN. Для других СУБД поле остаётся пустым.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_index_pack'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
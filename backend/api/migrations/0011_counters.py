@@ -0,0 +1,57 @@
+# Generated by Django 3.2.3 on 2026-10-17 04:41
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('api', 'Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('api', 'Recipe', 'shopping_cart_count', 'ShoppingCart', 'recipe'),
+    ('users', 'User', 'recipes_count', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'Subscription', 'author'),
+    ('users', 'User', 'following_count', 'Subscription', 'user'),
+)
+
+
+def count_related(model, field):
+    """Подзапрос: число строк model, ссылающихся на объект через field."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет новые счётчики по текущим данным."""
+    for app_label, model_name, field, related_model, related_field in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        related = apps.get_model('api', related_model)
+        model.objects.update(**{field: count_related(related, related_field)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_recipe_search_vector'),
+        ('users', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлено в списки покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-17 05:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='cache_generation',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Поколение кэша ответов'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_recipe_cache_generation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', '-id'], name='subscription_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,131 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import (get_recipe_generation, get_recipe_list_generation,
+                    get_reference_data_version, reference_payloads)
+from .metrics import get_timed_serializer_class, registry
+
+
+class SerializerTimingMixin:
+    """Учитывает время сериализации ответа в метриках запроса."""
+
+    def get_serializer_class(self):
+        return get_timed_serializer_class(super().get_serializer_class())
+
+
+class ReferenceDataCacheMixin:
+    """
+    Условные GET-запросы и кэширование ответов для справочников.
+    ETag строится по версии справочников, поэтому ответ 304
+    отдаётся без обращения к базе данных, в том числе клиентам с токеном.
+    """
+    cache_max_age = settings.REFERENCE_DATA_MAX_AGE
+
+    def perform_authentication(self, request):
+        """
+        Токен проверяется при первом обращении к request.user, а не до
+        вызова обработчика: ответы справочников от пользователя не
+        зависят, и запрос к таблице токенов им не нужен.
+        """
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request,
+                                        *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request,
+                                        *args, **kwargs)
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        version = get_reference_data_version()
+        etag = f'"{self.basename}-{version}"'
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+
+        if etag in if_none_match or '*' in if_none_match:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = request.get_full_path()
+            payload = reference_payloads.get(version, key)
+            if payload is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                reference_payloads.set(version, key, response.data)
+            else:
+                response = Response(payload)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={self.cache_max_age}'
+        return response
+
+
+def get_normalized_query(request):
+    """Строка запроса с упорядоченными параметрами и значениями."""
+    return urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+
+
+class AnonymousRecipeCacheMixin:
+    """
+    Кэш ответов list и retrieve для анонимных пользователей в общем кэше.
+    Ключ включает поколение рецептов и версию справочников, поэтому
+    после изменения рецепта, его автора или тегов старый ответ
+    больше не отдаётся. Запросы к несуществующим рецептам
+    не кэшируются. Счётчики избранного и списков покупок
+    в ответе могут отставать не дольше response_cache_timeout.
+    """
+    response_cache_timeout = settings.RECIPE_RESPONSE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            super().list, get_recipe_list_generation,
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.get_anonymous_response(
+            super().retrieve, lambda: get_recipe_generation(lookup),
+            request, *args, **kwargs
+        )
+
+    def get_response_cache_key(self, request, generation):
+        key = ':'.join(str(part) for part in (
+            self.action, generation, get_reference_data_version(),
+            request.build_absolute_uri(request.path),
+            get_normalized_query(request),
+        ))
+        return (f'response:{self.basename}:'
+                f'{hashlib.md5(key.encode()).hexdigest()}')
+
+    def get_anonymous_response(self, handler, get_generation,
+                               request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        generation = get_generation()
+        if generation is None:
+            return handler(request, *args, **kwargs)
+
+        name = f'{self.basename}-{self.action}'
+        key = self.get_response_cache_key(request, generation)
+        payload = cache.get(key)
+        registry.count_response_cache(name, payload is not None)
+        if payload is not None:
+            response = Response(payload)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.response_cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
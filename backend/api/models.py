@@ -1,9 +1,13 @@
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from rest_framework.exceptions import ValidationError
 
+from foodgram.storage import content_storage
+
 User = get_user_model()
 
 
@@ -15,7 +19,8 @@ class Tag(models.Model):
     )
     slug = models.SlugField(
         'Слаг',
-        max_length=32
+        max_length=32,
+        unique=True
     )
 
     class Meta:
@@ -42,6 +47,12 @@ class Ingredient(models.Model):
         verbose_name = 'ингридиент'
         verbose_name_plural = 'Ингридиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -75,11 +86,82 @@ class RecipeIngredient(models.Model):
         verbose_name = 'ингредиент для рецепта'
         verbose_name_plural = 'ингредиенты для рецептов'
         ordering = ('recipe',)
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient'],
+                include=['amount'],
+                name='recipe_ingredient_recipe_idx'
+            )
+        ]
 
     def __str__(self):
         return f'Ингридиенты для рецепта "{self.recipe.name}"'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet рецептов с аннотациями для текущего пользователя."""
+
+    def with_user_flags(self, user):
+        """
+        Добавляет признаки is_favorited и is_in_shopping_cart
+        одним запросом через коррелированные подзапросы.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        )
+
+    def with_related(self):
+        """
+        Подгружает автора, теги и ингредиенты рецептов,
+        чтобы число запросов не зависело от размера страницы.
+        Поисковый вектор для вывода не нужен и не загружается.
+        """
+        return self.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def for_user(self, user):
+        """Готовит рецепты к полной сериализации для пользователя."""
+        return self.with_related().with_user_flags(user)
+
+    def latest_for_authors(self, author_ids, limit):
+        """
+        Возвращает не более limit последних рецептов каждого автора
+        одним запросом с ROW_NUMBER() по автору.
+        """
+        author_ids = list(author_ids)
+        if not author_ids:
+            return []
+        table = self.model._meta.db_table
+        columns = ', '.join(
+            field.column for field in self.model._meta.concrete_fields
+            if field.name != 'search_vector'
+        )
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        return self.raw(
+            f'SELECT * FROM ('
+            f'SELECT {columns}, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY id DESC) AS row_number '
+            f'FROM {table} WHERE author_id IN ({placeholders})'
+            f') AS ranked WHERE row_number <= %s ORDER BY author_id, id DESC',
+            [*author_ids, limit]
+        )
+
+
 class Recipe(models.Model):
     """
     Модель рецепта с указанием его ингредиентов, автора и других характеристик.
@@ -107,7 +189,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         'Ссылка на картинку на сайте',
-        upload_to='images/',
+        upload_to='content/',
+        storage=content_storage,
         blank=True,
         null=True
     )
@@ -121,11 +204,40 @@ class Recipe(models.Model):
             MaxValueValidator(settings.MAX_COOKING_TIME)
         ]
     )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлено в избранное',
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'Добавлено в списки покупок',
+        default=0,
+        editable=False
+    )
+    cache_generation = models.PositiveIntegerField(
+        'Поколение кэша ответов',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = [
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_idx'
+            ),
+            models.Index(fields=['image'], name='recipe_image_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -159,6 +271,12 @@ class Subscription(models.Model):
                 name='unique_subscription'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', '-id'],
+                name='subscription_user_id_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
@@ -191,6 +309,13 @@ class Favorite(models.Model):
                 name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe'],
+                include=['user'],
+                name='favorite_recipe_user_idx'
+            )
+        ]
         verbose_name = 'избранное'
         verbose_name_plural = 'Избранные рецепты'
         ordering = ('-id',)
@@ -224,9 +349,50 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe'],
+                include=['user'],
+                name='shopping_cart_recipe_user_idx'
+            )
+        ]
         verbose_name = 'список покупок'
         verbose_name_plural = 'Списки покупок'
         ordering = ('-id',)
 
     def __str__(self):
         return f'{self.user.email} - {self.recipe.name} в списке покупок'
+
+
+class ShoppingCartIngredient(models.Model):
+    """
+    Итоговое количество ингредиента в списке покупок пользователя.
+    Поддерживается при изменении списка покупок и ингредиентов рецептов.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_cart_ingredients',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_cart_ingredients',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        ordering = ('user', 'ingredient')
+
+    def __str__(self):
+        return f'{self.user.email} - {self.ingredient.name}: {self.amount}'
@@ -1,11 +1,36 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
 
-from foodgram.settings import DEFAULT_PAGE_SIZE
+from django.db import connections
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
+from foodgram.settings import (APPROXIMATE_PAGE_COUNT, DEFAULT_PAGE_SIZE,
+                               MAX_PAGE_SIZE)
+from .encoding import decode_id, encode_id
 
-class CustomLimitPagination(PageNumberPagination):
-    """Кастомная пагинация с лимитом на количество элементов."""
+
+def get_approximate_count(queryset):
+    """
+    Оценивает число строк запроса по статистике планировщика PostgreSQL
+    без выполнения COUNT(*). Для других СУБД возвращает None.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return plan[0]['Plan']['Plan Rows']
+
+
+class LimitMixin:
+    """Размер страницы из параметра limit с ограничением сверху."""
     page_size = DEFAULT_PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
 
     def get_page_size(self, request):
         """Получает размер страницы из параметров запроса."""
@@ -13,7 +38,89 @@ class CustomLimitPagination(PageNumberPagination):
         limit = request.query_params.get('limit')
         if limit:
             try:
-                return int(limit)
+                return max(1, min(int(limit), self.max_page_size))
             except ValueError:
                 pass
-        return super().get_page_size(request)
+        return self.page_size
+
+
+class KeysetPagination(LimitMixin, CursorPagination):
+    """
+    Пагинация по курсору на порядке -id: без COUNT(*) и OFFSET.
+    Количество записей, если включено, берётся из оценки планировщика.
+    """
+    ordering = '-id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.queryset = queryset
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if APPROXIMATE_PAGE_COUNT:
+            response['count'] = get_approximate_count(self.queryset)
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+
+class CustomLimitPagination(LimitMixin, PageNumberPagination):
+    """
+    Кастомная пагинация с лимитом на количество элементов.
+    Параметр cursor (в том числе пустой) включает пагинацию по курсору,
+    без него работает постраничная пагинация по page. Курсор хранит
+    только id, поэтому запросы с собственным порядком, например поиск
+    по релевантности, всегда листаются по page.
+    """
+    cursor_query_param = 'cursor'
+
+    def supports_keyset(self, queryset):
+        """Запрос упорядочен так же, как курсор, или не упорядочен явно."""
+        return queryset.query.order_by in ((), (KeysetPagination.ordering,))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_paginator = None
+        if (self.cursor_query_param in request.query_params
+                and self.supports_keyset(queryset)):
+            self.keyset_paginator = KeysetPagination()
+            return self.keyset_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class TimelinePagination(LimitMixin, BasePagination):
+    """
+    Пагинация ленты по курсору. Курсор — закодированный id
+    последнего рецепта страницы, следующая страница начинается
+    с рецептов старше него.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_cursor(self, request):
+        """Возвращает id из курсора или None для первой страницы."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            return decode_id(cursor)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self, request, last_id):
+        return replace_query_param(request.build_absolute_uri(),
+                                   self.cursor_query_param,
+                                   encode_id(last_id))
+
+    def get_paginated_response(self, data, next_link):
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('results', data),
+        ]))
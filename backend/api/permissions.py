@@ -0,0 +1,20 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsRecipeAuthor(BasePermission):
+    """
+    Доступ к рецепту только его автору. Проверяется в get_object,
+    поэтому объект загружается из базы один раз.
+    """
+    messages = {
+        'DELETE': 'Вы не можете удалять чужой рецепт.',
+    }
+    default_message = 'Вы не можете обновлять чужой рецепт.'
+
+    def has_object_permission(self, request, view, obj):
+        if obj.author_id == request.user.id:
+            return True
+        self.message = {
+            'error': self.messages.get(request.method, self.default_message)
+        }
+        return False
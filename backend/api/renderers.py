@@ -0,0 +1,85 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """Псевдобуфер, возвращающий записанную строку для потоковой отдачи."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(ABC, BaseRenderer):
+    """
+    Рендерер списка покупок. stream построчно формирует файл из строк
+    get_shopping_list для потоковой отдачи, render собирает его целиком.
+    Ответы с ошибками (словари) отдаются как строки "поле: сообщение".
+    """
+    charset = 'utf-8'
+
+    @abstractmethod
+    def stream(self, rows):
+        """Генератор частей файла по строкам списка покупок."""
+
+    def render_errors(self, data):
+        return ''.join(
+            f'{field}: {" ".join(map(str, messages))}\n'
+            if isinstance(messages, list) else f'{field}: {messages}\n'
+            for field, messages in data.items()
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, Mapping):
+            return self.render_errors(data).encode(self.charset)
+        return ''.join(self.stream(data)).encode(self.charset)
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for row in rows:
+            yield (f"{row['name']} - {row['total_amount']} "
+                   f"{row['measurement_unit']}\n")
+
+
+class CSVRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(
+                (row['name'], row['measurement_unit'], row['total_amount'])
+            )
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Список покупок в виде JSON-массива."""
+    media_type = 'application/json'
+    format = 'json'
+
+    def render_errors(self, data):
+        return json.dumps(data, ensure_ascii=False)
+
+    def stream(self, rows):
+        yield '['
+        separator = ''
+        for row in rows:
+            item = {
+                'name': row['name'],
+                'measurement_unit': row['measurement_unit'],
+                'amount': row['total_amount'],
+            }
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield ']'
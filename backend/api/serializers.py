@@ -1,26 +1,151 @@
 import base64
+from collections import Counter, defaultdict
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
 from django.conf import settings
+from django.db import transaction
+from PIL import Image
 from rest_framework.exceptions import ValidationError
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from .cache import invalidate_recipe_responses
+from .images import get_rendition_urls
 from .models import Recipe, RecipeIngredient, Subscription, Tag, Ingredient
+from .shopping_list import update_recipe_in_shopping_lists
 
 User = get_user_model()
 
 
+def get_subscribed_author_ids(context):
+    """
+    Возвращает множество id авторов, на которых подписан пользователь.
+    Множество загружается одним запросом и кэшируется в контексте.
+    """
+    if 'subscribed_author_ids' not in context:
+        user = context['request'].user
+        context['subscribed_author_ids'] = (
+            set(user.follower.values_list('author_id', flat=True))
+            if user.is_authenticated else set()
+        )
+    return context['subscribed_author_ids']
+
+
 class Base64ImageField(serializers.ImageField):
-    """Поле для обработки изображений в формате base64."""
+    """
+    Поле для обработки изображений в формате base64.
+    Проверяет размер файла до декодирования и размер в пикселях
+    до полной загрузки изображения.
+    """
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
+            if len(imgstr) * 3 // 4 > settings.IMAGE_MAX_BYTES:
+                raise ValidationError(
+                    f'Размер изображения не должен превышать '
+                    f'{settings.IMAGE_MAX_BYTES // (1024 * 1024)} МБ.'
+                )
             data = ContentFile(base64.b64decode(imgstr), name=f'temp.{ext}')
+        self.validate_pixels(data)
         return super().to_internal_value(data)
 
+    def validate_pixels(self, data):
+        """Проверяет ширину и высоту изображения по его заголовку."""
+        if isinstance(data, str):
+            return
+        try:
+            with Image.open(data) as image:
+                width, height = image.size
+        except Exception:
+            return
+        finally:
+            if hasattr(data, 'seek'):
+                data.seek(0)
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                f'Изображение не должно содержать больше '
+                f'{settings.IMAGE_MAX_PIXELS} пикселей.'
+            )
+
+
+class ImageRenditionsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения в формате WebP."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        return {
+            rendition: request.build_absolute_uri(url) if request else url
+            for rendition, url in get_rendition_urls(value).items()
+        }
+
+
+def get_objects_in_bulk(queryset, ids, message):
+    """
+    Загружает объекты по списку id одним запросом.
+    Если каких-то объектов нет, сообщает обо всех отсутствующих id сразу.
+    """
+    objects = queryset.in_bulk(set(ids))
+    missing = sorted(set(ids) - objects.keys())
+    if missing:
+        raise ValidationError(
+            f'{message}: {", ".join(str(id) for id in missing)}.'
+        )
+    return objects
+
+
+def parse_ids(values, field):
+    """Приводит переданные значения к списку целочисленных id."""
+    ids = []
+    for value in values:
+        if isinstance(value, bool):
+            field.fail('incorrect_type', data_type=type(value).__name__)
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            field.fail('incorrect_type', data_type=type(value).__name__)
+    return ids
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список связанных объектов, загружаемых одним запросом IN."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        ids = parse_ids(data, self.child_relation)
+        objects = get_objects_in_bulk(
+            self.child_relation.get_queryset(), ids,
+            'Объекты с такими id не существуют'
+        )
+        return [objects[id] for id in ids]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который при many=True
+    проверяет и загружает все объекты одним запросом.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
@@ -38,36 +163,83 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+def get_recipes_limit(request):
+    """
+    Возвращает число рецептов автора из параметра recipes_limit,
+    ограниченное сверху MAX_PAGE_SIZE.
+    """
+    recipes_limit = request.query_params.get('recipes_limit')
+
+    if recipes_limit is not None:
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = None
+    if recipes_limit is None or recipes_limit < 1:
+        recipes_limit = settings.DEFAULT_PAGE_SIZE
+    return min(recipes_limit, settings.MAX_PAGE_SIZE)
+
+
+class UserListSerializer(serializers.ListSerializer):
+    """
+    Сериализатор списка пользователей, загружающий рецепты авторов,
+    на которых подписан текущий пользователь, фиксированным числом запросов.
+    """
+
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context['request']
+        subscribed_author_ids = get_subscribed_author_ids(self.context)
+        recipe_ids = [
+            recipe.id for recipe in Recipe.objects.latest_for_authors(
+                [user.id for user in users
+                 if user.id in subscribed_author_ids],
+                get_recipes_limit(request)
+            )
+        ]
+        author_recipes = defaultdict(list)
+        for recipe in Recipe.objects.for_user(request.user).filter(
+                id__in=recipe_ids):
+            author_recipes[recipe.author_id].append(recipe)
+        self.context['author_recipes'] = author_recipes
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для пользователей."""
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
     avatar = Base64ImageField()
+    avatar_renditions = ImageRenditionsField(source='avatar')
 
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name',
-            'last_name', 'avatar', 'is_subscribed',
-            'recipes', 'recipes_count'
+            'last_name', 'avatar', 'avatar_renditions', 'is_subscribed',
+            'recipes', 'recipes_count', 'followers_count', 'following_count'
         )
+        list_serializer_class = UserListSerializer
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return user.follower.filter(author=obj).exists()
-        return False
+        return obj.id in get_subscribed_author_ids(self.context)
 
     def get_recipes(self, obj):
         if self.get_is_subscribed(obj):
-            recipes = obj.recipes.all()
+            author_recipes = self.context.get('author_recipes')
+            if author_recipes is not None:
+                recipes = author_recipes[obj.id]
+            else:
+                request = self.context['request']
+                recipes = Recipe.objects.for_user(request.user).filter(
+                    author=obj)[:get_recipes_limit(request)]
             return RecipeSerializer(recipes, many=True,
                                     context=self.context).data
 
     def get_recipes_count(self, obj):
         if self.get_is_subscribed(obj):
-            return obj.recipes.count()
+            return obj.recipes_count
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -84,19 +256,31 @@ class AuthorSerializer(UserSerializer):
 
     class Meta(UserSerializer.Meta):
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'is_subscribed', 'avatar')
+                  'last_name', 'is_subscribed', 'avatar', 'avatar_renditions')
+        list_serializer_class = serializers.ListSerializer
 
-    def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.follower.filter(author=obj).exists())
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """
+    Список ингредиентов рецепта: все ингредиенты загружаются
+    одним запросом вместо запроса на каждый элемент.
+    """
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = get_objects_in_bulk(
+            Ingredient.objects.all(),
+            [item['ingredient'] for item in items],
+            'Некоторые ингредиенты не существуют'
+        )
+        for item in items:
+            item['ingredient'] = ingredients[item['ingredient']]
+        return items
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиентов в рецепте."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source='ingredient'
-    )
+    id = serializers.IntegerField(source='ingredient')
     amount = serializers.IntegerField(
         min_value=settings.MIN_AMOUNT,
         max_value=settings.MAX_AMOUNT
@@ -105,6 +289,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class RecipeIngredientDetailSerializer(serializers.ModelSerializer):
@@ -126,6 +311,7 @@ class BaseRecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField()
     text = serializers.CharField(required=True)
     image = Base64ImageField()
+    image_renditions = ImageRenditionsField(source='image')
     cooking_time = serializers.IntegerField(
         min_value=settings.MIN_COOKING_TIME,
         max_value=settings.MAX_COOKING_TIME
@@ -134,15 +320,22 @@ class BaseRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+                  'text', 'cooking_time', 'favorites_count',
+                  'shopping_cart_count')
 
     def get_is_favorited(self, obj):
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         user = self.context['request'].user
         return (user.is_authenticated
                 and user.favorites.filter(recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context['request'].user
         return (user.is_authenticated
                 and user.shopping_cart.filter(recipe=obj).exists())
@@ -158,12 +351,6 @@ class BaseRecipeSerializer(serializers.ModelSerializer):
             )
 
         ingredient_ids = [item['ingredient'].id for item in ingredients]
-        if not Ingredient.objects.filter(
-                id__in=ingredient_ids).count() == len(ingredient_ids):
-            raise ValidationError(
-                {'recipe_ingredients': 'Некоторые ингредиенты не существуют.'}
-            )
-
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise ValidationError(
                 {'recipe_ingredients': 'Ингредиенты не должны повторяться.'}
@@ -194,8 +381,7 @@ class RecipeSerializer(BaseRecipeSerializer):
     """Сериализатор для рецептов."""
     ingredients = RecipeIngredientSerializer(many=True,
                                              source='recipe_ingredients')
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
 
     def validate(self, data):
         data = super().validate(data)
@@ -209,6 +395,7 @@ class RecipeSerializer(BaseRecipeSerializer):
         ]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredients')
         tags = validated_data.pop('tags')
@@ -220,15 +407,85 @@ class RecipeSerializer(BaseRecipeSerializer):
 
         return recipe
 
+    def update_recipe_ingredients(self, recipe, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к переданным, выполняя только
+        нужные INSERT, UPDATE и DELETE.
+        """
+        submitted = {
+            item['ingredient'].id: item['amount'] for item in ingredients_data
+        }
+        current = {}
+        to_delete = []
+        deltas = Counter()
+        for recipe_ingredient in recipe.recipe_ingredients.all():
+            ingredient_id = recipe_ingredient.ingredient_id
+            if ingredient_id in current or ingredient_id not in submitted:
+                to_delete.append(recipe_ingredient.id)
+                deltas[ingredient_id] -= recipe_ingredient.amount
+            else:
+                current[ingredient_id] = recipe_ingredient
+
+        to_update = []
+        to_create = []
+        for ingredient_id, amount in submitted.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+                deltas[ingredient_id] += amount
+            elif recipe_ingredient.amount != amount:
+                deltas[ingredient_id] += amount - recipe_ingredient.amount
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        if to_update or to_create:
+            invalidate_recipe_responses([recipe.id])
+        update_recipe_in_shopping_lists(recipe, deltas)
+
+    def update_tags(self, recipe, tags):
+        """Обновляет теги рецепта, только если их набор изменился."""
+        if {tag.id for tag in recipe.tags.all()} != {tag.id for tag in tags}:
+            recipe.tags.set(tags)
+
+    def is_changed(self, instance, attr, value):
+        """
+        Загруженное изображение сравнивается по имени, под которым
+        хранилище сохранит его содержимое, остальные поля — по значению.
+        """
+        if attr != 'image' or not value:
+            return getattr(instance, attr) != value
+        field = instance._meta.get_field(attr)
+        name = field.storage.get_content_name(
+            field.generate_filename(instance, value.name), value
+        )
+        return name != getattr(instance, attr).name
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('recipe_ingredients', [])
-        tags_data = validated_data.pop('tags', [])
-        instance = super().update(instance, validated_data)
+        ingredients_data = validated_data.pop('recipe_ingredients', None)
+        tags_data = validated_data.pop('tags', None)
 
-        instance.recipe_ingredients.all().delete()
+        changed_fields = [
+            attr for attr, value in validated_data.items()
+            if self.is_changed(instance, attr, value)
+        ]
+        for attr in changed_fields:
+            setattr(instance, attr, validated_data[attr])
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
 
-        self.create_recipe_ingredients(instance, ingredients_data)
-        instance.tags.set(tags_data)
+        if ingredients_data is not None:
+            self.update_recipe_ingredients(instance, ingredients_data)
+        if tags_data is not None:
+            self.update_tags(instance, tags_data)
 
         return instance
 
@@ -238,9 +495,28 @@ class RecipeSerializer(BaseRecipeSerializer):
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого представления рецептов."""
+    image_renditions = ImageRenditionsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'image_renditions', 'cooking_time']
+
+
+class SubscriptionListSerializer(serializers.ListSerializer):
+    """
+    Сериализатор списка подписок, загружающий последние рецепты
+    всех авторов страницы одним запросом.
+    """
+
+    def to_representation(self, data):
+        subscriptions = list(data.all() if hasattr(data, 'all') else data)
+        author_recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_for_authors(
+                {subscription.author_id for subscription in subscriptions},
+                get_recipes_limit(self.context['request'])):
+            author_recipes[recipe.author_id].append(recipe)
+        self.context['author_recipes'] = author_recipes
+        return super().to_representation(subscriptions)
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -253,6 +529,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     last_name = serializers.CharField(source='author.last_name',
                                       read_only=True)
     avatar = Base64ImageField(source='author.avatar', read_only=True)
+    avatar_renditions = ImageRenditionsField(source='author.avatar')
     is_subscribed = serializers.SerializerMethodField()
     recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
@@ -261,8 +538,10 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         model = Subscription
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'avatar', 'is_subscribed', 'recipes', 'recipes_count'
+            'avatar', 'avatar_renditions', 'is_subscribed', 'recipes',
+            'recipes_count'
         )
+        list_serializer_class = SubscriptionListSerializer
 
     def validate(self, data):
         user = self.context['request'].user
@@ -275,24 +554,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.follower.filter(author=obj.author).exists())
+        return obj.user_id == self.context['request'].user.id
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.count()
+        return obj.author.recipes_count
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-
-        if recipes_limit is not None:
-            try:
-                recipes_limit = int(recipes_limit)
-            except ValueError:
-                recipes_limit = None
-        recipes_limit_value = recipes_limit or settings.DEFAULT_PAGE_SIZE
-        recipes = obj.author.recipes.all()[:recipes_limit_value]
+        author_recipes = self.context.get('author_recipes')
+        if author_recipes is not None:
+            recipes = author_recipes[obj.author_id]
+        else:
+            recipes = obj.author.recipes.all()[
+                :get_recipes_limit(self.context['request'])]
 
         return RecipeShortSerializer(recipes, many=True,
                                      context=self.context).data
@@ -0,0 +1,207 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import RecipeIngredient, ShoppingCartIngredient
+
+removed_recipes = ContextVar('removed_recipes', default=frozenset())
+
+
+def get_shopping_list(user):
+    """
+    Возвращает суммарное количество каждого ингредиента из списка покупок
+    пользователя, читая заранее посчитанные итоги.
+    """
+    return (
+        ShoppingCartIngredient.objects
+        .filter(user=user)
+        .values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')
+        )
+        .annotate(total_amount=Sum('amount'))
+        .order_by('name', 'measurement_unit')
+    )
+
+
+def get_recipe_amounts(recipe):
+    """Возвращает количество каждого ингредиента рецепта по его id."""
+    amounts = Counter()
+    for ingredient_id, amount in recipe.recipe_ingredients.values_list(
+            'ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def add_to_shopping_lists(rows, batch_size=1000):
+    """
+    Прибавляет количества к итогам списков покупок одним запросом
+    INSERT ... ON CONFLICT DO UPDATE на пачку. В отличие от чтения
+    с последующей вставкой, одновременные добавления одного ингредиента
+    не нарушают уникальность, а складываются.
+    rows — кортежи (user_id, ingredient_id, amount) с amount > 0.
+    """
+    table = connection.ops.quote_name(ShoppingCartIngredient._meta.db_table)
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            values = ', '.join(['(%s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'VALUES {values} '
+                f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {table}.amount + EXCLUDED.amount',
+                [value for row in batch for value in row]
+            )
+
+
+def change_shopping_lists(user_ids, deltas):
+    """
+    Изменяет итоги списков покупок пользователей на заданные величины
+    и удаляет ингредиенты, количество которых стало нулевым.
+    Должна вызываться внутри транзакции, меняющей список покупок.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not deltas:
+        return
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    add_to_shopping_lists(
+        (user_id, ingredient_id, delta)
+        for user_id in user_ids
+        for ingredient_id, delta in deltas.items() if delta > 0
+    )
+    decreases = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta < 0
+    }
+    if not decreases:
+        return
+    items = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=decreases
+    )
+    items.update(amount=Greatest(
+        F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in decreases.items()),
+            default=Value(0),
+            output_field=IntegerField()
+        ),
+        0
+    ))
+    items.filter(amount=0).delete()
+
+
+def add_recipe_to_shopping_list(user, recipe):
+    """Добавляет ингредиенты рецепта в итоги списка покупок."""
+    change_shopping_lists([user.id], get_recipe_amounts(recipe))
+
+
+def remove_recipe_from_shopping_list(user, recipe):
+    """Вычитает ингредиенты рецепта из итогов списка покупок."""
+    change_shopping_lists([user.id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe).items()
+    })
+
+
+def update_recipe_in_shopping_lists(recipe, deltas):
+    """
+    Переносит изменение ингредиентов рецепта в итоги списков покупок
+    всех пользователей, у которых рецепт лежит в корзине.
+    """
+    change_shopping_lists(
+        recipe.in_shopping_cart.values_list('user_id', flat=True), deltas
+    )
+
+
+def subtract_from_shopping_lists(amounts):
+    """
+    Вычитает количества из итогов списков покупок одним UPDATE
+    и удаляет ставшие нулевыми итоги.
+    amounts — словарь (user_id, ingredient_id) -> amount.
+    """
+    if not amounts:
+        return
+    items = ShoppingCartIngredient.objects.filter(
+        user_id__in={user_id for user_id, _ in amounts},
+        ingredient_id__in={ingredient_id for _, ingredient_id in amounts}
+    )
+    items.update(amount=Greatest(
+        F('amount') - Case(
+            *(When(user_id=user_id, ingredient_id=ingredient_id,
+                   then=Value(amount))
+              for (user_id, ingredient_id), amount in amounts.items()),
+            default=Value(0),
+            output_field=IntegerField()
+        ),
+        0
+    ))
+    items.filter(amount=0).delete()
+
+
+def remove_recipes_from_shopping_lists(recipe_ids):
+    """
+    Вычитает ингредиенты удаляемых рецептов из списков покупок всех
+    пользователей, у которых они лежат в корзине. Вызывается до
+    удаления, пока записи корзины существуют.
+    """
+    rows = (
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids,
+                recipe__in_shopping_cart__isnull=False)
+        .values_list('recipe__in_shopping_cart__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+    )
+    subtract_from_shopping_lists({
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount in rows
+    })
+
+
+@contextmanager
+def removing_recipes(recipes):
+    """
+    Вычитает рецепты из списков покупок пачкой перед их каскадным
+    удалением. Сигнал pre_delete пропускает эти рецепты, поэтому
+    число запросов не зависит от числа рецептов.
+    """
+    recipe_ids = set(recipes.values_list('id', flat=True))
+    remove_recipes_from_shopping_lists(recipe_ids)
+    token = removed_recipes.set(removed_recipes.get() | recipe_ids)
+    try:
+        yield
+    finally:
+        removed_recipes.reset(token)
+
+
+def calculate_shopping_lists():
+    """
+    Заново считает итоги всех списков покупок по ShoppingCart
+    и RecipeIngredient. Возвращает словарь (user_id, ingredient_id) -> amount.
+    """
+    rows = (
+        RecipeIngredient.objects
+        .filter(recipe__in_shopping_cart__isnull=False)
+        .values_list('recipe__in_shopping_cart__user', 'ingredient')
+        .annotate(total_amount=Sum('amount'))
+        .order_by()
+    )
+    return {
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount in rows.iterator()
+    }
@@ -0,0 +1,226 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .cache import bump_reference_data_version, invalidate_recipe_responses
+from .counters import change_counter, refresh_counters
+from .feed import (push_recipe, rebuild_timeline_on_commit,
+                   remove_recipe_on_commit)
+from .images import get_file_name, release_image, schedule_renditions
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Subscription, Tag)
+from .shopping_list import removed_recipes, remove_recipes_from_shopping_lists
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name', 'avatar'}
+IMAGE_FIELDS = {Recipe: 'image', User: 'avatar'}
+COUNTER_FIELDS = {
+    Recipe: ('favorites_count', 'shopping_cart_count', 'cache_generation'),
+    User: ('recipes_count', 'followers_count', 'following_count'),
+}
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def change_reference_data_version(**kwargs):
+    """Меняет версию справочников после изменения тега или ингредиента."""
+    transaction.on_commit(bump_reference_data_version)
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_image_name(sender, instance, **kwargs):
+    """Запоминает имя файла изображения, с которым загружен объект."""
+    instance._image_name = get_file_name(instance, IMAGE_FIELDS[sender])
+
+
+def get_author_values(user):
+    """
+    Значения полей пользователя, выводимых в рецептах. Отложенные
+    поля не загружаются и считаются пустыми.
+    """
+    values = {field: user.__dict__.get(field)
+              for field in AUTHOR_FIELDS - {'avatar'}}
+    values['avatar'] = get_file_name(user, 'avatar')
+    return values
+
+
+@receiver(post_init, sender=User)
+def remember_author_values(instance, **kwargs):
+    """Запоминает данные автора, с которыми загружен пользователь."""
+    instance._author_values = get_author_values(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def handle_image_change(sender, instance, created, update_fields,
+                        **kwargs):
+    """
+    После смены файла изображения запускает создание уменьшенных копий
+    нового файла и освобождает старый. Полное сохранение и повторная
+    загрузка той же картинки ничего не делают. У нового объекта
+    прежнее имя — имя загруженного, ещё не сохранённого файла,
+    поэтому освобождать нечего.
+    """
+    field = IMAGE_FIELDS[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    name = get_file_name(instance, field)
+    if name is None or name == instance._image_name:
+        return
+    old_name, instance._image_name = instance._image_name, name
+    schedule_renditions(name)
+    if not created:
+        release_image(old_name)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_deleted_image(sender, instance, **kwargs):
+    """
+    Освобождает изображение удалённого объекта, в том числе при
+    каскадном удалении и удалении из админки.
+    """
+    release_image(get_file_name(instance, IMAGE_FIELDS[sender]))
+
+
+@receiver(post_save, sender=Recipe)
+def push_recipe_to_feeds(instance, created, **kwargs):
+    """Разносит новый рецепт по лентам подписчиков после фиксации."""
+    if created:
+        author_id, recipe_id = instance.author_id, instance.id
+        transaction.on_commit(lambda: push_recipe(author_id, recipe_id))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_carts(instance, **kwargs):
+    """
+    Вычитает удаляемый рецепт из итогов списков покупок, пока записи
+    корзины ещё существуют. Срабатывает и при каскадном удалении
+    рецептов вместе с автором, и при удалении из админки. Рецепты,
+    уже вычтенные пачкой в removing_recipes, пропускаются.
+    """
+    if instance.id not in removed_recipes.get():
+        remove_recipes_from_shopping_lists([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_feeds(instance, **kwargs):
+    """Убирает удалённый рецепт из лент подписчиков."""
+    remove_recipe_on_commit(instance.author_id, instance.id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def rebuild_subscriber_feed(instance, **kwargs):
+    """Перестраивает ленту пользователя после подписки или отписки."""
+    rebuild_timeline_on_commit(instance.user_id)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def keep_counters_on_full_save(sender, instance, update_fields, raw,
+                               **kwargs):
+    """
+    Счётчики и поколение кэша меняются только UPDATE с F()-выражением,
+    поэтому перед полным сохранением существующего объекта они
+    перечитываются из базы.
+    """
+    if raw or update_fields is not None or instance._state.adding:
+        return
+    deferred_fields = instance.get_deferred_fields()
+    refresh_counters(instance, [
+        field for field in COUNTER_FIELDS[sender]
+        if field not in deferred_fields
+    ])
+
+
+def get_counter_delta(signal, created=False):
+    """+1 для созданной записи, -1 для удалённой, 0 для изменённой."""
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def count_favorites(signal, instance, created=False, **kwargs):
+    """Обновляет число добавлений рецепта в избранное."""
+    delta = get_counter_delta(signal, created)
+    if delta:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', delta)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def count_shopping_carts(signal, instance, created=False, **kwargs):
+    """Обновляет число добавлений рецепта в списки покупок."""
+    delta = get_counter_delta(signal, created)
+    if delta:
+        change_counter(Recipe, instance.recipe_id, 'shopping_cart_count',
+                       delta)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def count_recipes(signal, instance, created=False, **kwargs):
+    """Обновляет число рецептов автора."""
+    delta = get_counter_delta(signal, created)
+    if delta:
+        change_counter(User, instance.author_id, 'recipes_count', delta)
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def count_subscriptions(signal, instance, created=False, **kwargs):
+    """Обновляет число подписчиков автора и подписок пользователя."""
+    delta = get_counter_delta(signal, created)
+    if delta:
+        change_counter(User, instance.author_id, 'followers_count', delta)
+        change_counter(User, instance.user_id, 'following_count', delta)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    """Сбрасывает кэш ответов после изменения рецепта."""
+    invalidate_recipe_responses([instance.id])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    """Сбрасывает кэш ответов после изменения ингредиентов рецепта."""
+    invalidate_recipe_responses([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, **kwargs):
+    """
+    Сбрасывает кэш ответов после изменения тегов рецепта.
+    Изменение со стороны тега затрагивает неизвестный набор рецептов,
+    поэтому меняется версия справочников, входящая во все ключи.
+    """
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        transaction.on_commit(bump_reference_data_version)
+    else:
+        invalidate_recipe_responses([instance.id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields, **kwargs):
+    """
+    Сбрасывает кэш рецептов автора после изменения выводимых в них
+    данных. Полное сохранение без таких изменений (например, смена
+    пароля) кэш не трогает. Рецепты удалённого автора удаляются
+    каскадно и сбрасываются сами.
+    """
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    values = get_author_values(instance)
+    if values == instance._author_values:
+        return
+    instance._author_values = values
+    invalidate_recipe_responses(
+        instance.recipes.values_list('id', flat=True)
+    )
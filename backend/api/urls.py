@@ -3,8 +3,9 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .async_views import make_async_urlpatterns
 from .views import (UserViewSet, TagViewSet, SubscriptionViewSet,
-                    IngredientViewSet, RecipeViewSet)
+                    IngredientViewSet, RecipeViewSet, redirect_to_recipe)
 
 router = DefaultRouter()
 router.register('users', UserViewSet, basename='users')
@@ -58,8 +59,7 @@ urlpatterns = [
     ),
     path(
         's/<str:encoded_id>/',
-        RecipeViewSet.as_view(
-            {'get': 'redirect_to_recipe'}),
+        redirect_to_recipe,
         name='recipe_detail'
     ),
     path('auth/', include('djoser.urls')),
@@ -67,6 +67,9 @@ urlpatterns = [
     path('', include(router.urls)),
 ]
 
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = make_async_urlpatterns(urlpatterns)
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
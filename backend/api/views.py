@@ -6,17 +6,33 @@ from rest_framework.decorators import action
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from django.shortcuts import get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
 from django.conf import settings
+from django.db import transaction
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet as BaseUserViewSet
 
+from .cache import batch_invalidations
+from .counters import batch_counters
 from .encoding import encode_id, decode_id
-from .pagination import CustomLimitPagination
+from .feed import batch_timelines, discard_missing, get_feed_page
+from .ingredient_index import ingredient_index
+from .metrics import registry, render_metrics
+from .mixins import (AnonymousRecipeCacheMixin, ReferenceDataCacheMixin,
+                     SerializerTimingMixin)
+from .pagination import CustomLimitPagination, TimelinePagination
+from .permissions import IsRecipeAuthor
+from .renderers import (CSVRenderer, PlainTextRenderer,
+                        ShoppingListJSONRenderer)
+from .shopping_list import (add_recipe_to_shopping_list, get_shopping_list,
+                            remove_recipe_from_shopping_list,
+                            removing_recipes)
 from .filters import IngredientFilter, RecipeFilter
 from .models import (Tag, Ingredient, Subscription, Recipe, Favorite,
-                     ShoppingCart, RecipeIngredient)
+                     ShoppingCart)
 from .serializers import (UserSerializer, TagSerializer, IngredientSerializer,
                           SubscriptionSerializer, RecipeSerializer,
                           RecipeShortSerializer)
@@ -24,14 +40,16 @@ from .serializers import (UserSerializer, TagSerializer, IngredientSerializer,
 User = get_user_model()
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(SerializerTimingMixin, ReferenceDataCacheMixin,
+                 ReadOnlyModelViewSet):
     """Обрабатывает запросы к тегам."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(SerializerTimingMixin, ReferenceDataCacheMixin,
+                        ReadOnlyModelViewSet):
     """Обрабатывает запросы к ингредиентам."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -39,8 +57,32 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
-
-class SubscriptionViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        """
+        Отдаёт ингредиенты из индекса в памяти с ETag и кэшированием
+        ответа, как остальные ответы справочников.
+        """
+        return self.get_cached_response(self.search, request,
+                                        *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        """
+        Ищет ингредиенты в индексе в памяти, не обращаясь к базе.
+        При поиске по name сначала идут совпадения по началу названия.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return Response(ingredient_index.all())
+
+        limit = request.query_params.get('limit')
+        try:
+            limit = min(int(limit), settings.INGREDIENT_SEARCH_LIMIT)
+        except (TypeError, ValueError):
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        return Response(ingredient_index.search(name, limit))
+
+
+class SubscriptionViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     """Обрабатывает подписки пользователей."""
     queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
@@ -48,8 +90,8 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
     pagination_class = CustomLimitPagination
 
     def get_queryset(self):
-        """Возвращает список подписок текущего пользователя."""
-        return self.request.user.follower.all()
+        """Возвращает список подписок текущего пользователя с авторами."""
+        return self.request.user.follower.select_related('author')
 
     @action(detail=True, methods=['post'])
     def subscribe(self, request, pk=None):
@@ -80,13 +122,39 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(BaseUserViewSet):
+class UserViewSet(SerializerTimingMixin, BaseUserViewSet):
     """Обрабатывает запросы к пользователям."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomLimitPagination
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
+    def get_queryset(self):
+        """Возвращает пользователей в постоянном порядке для пагинации."""
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.order_by('id')
+        return queryset
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        """
+        Обновить пользователя. Транзакция держит блокировку имени
+        файла аватара, пока ссылка на него не зафиксирована.
+        """
+        super().perform_update(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """
+        Удалить пользователя. Счётчики рецептов и подписок, списки
+        покупок, ленты и кэш рецептов, затронутые каскадным удалением,
+        обновляются пачкой.
+        """
+        with batch_counters(), batch_timelines(), batch_invalidations(), \
+                removing_recipes(instance.recipes.all()):
+            instance.delete()
+
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Получить данные текущего пользователя."""
@@ -98,8 +166,12 @@ class UserViewSet(BaseUserViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['put'])
+    @transaction.atomic
     def update_avatar(self, request):
-        """Обновить аватар пользователя."""
+        """
+        Обновить аватар пользователя. Транзакция держит блокировку
+        имени файла, пока ссылка на него не зафиксирована.
+        """
         user = request.user
         avatar = request.data.get('avatar')
 
@@ -119,11 +191,13 @@ class UserViewSet(BaseUserViewSet):
     def delete_avatar(self, request):
         """Удалить аватар пользователя."""
         user = request.user
-        user.avatar.delete(save=True)
+        user.avatar = None
+        user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SerializerTimingMixin, AnonymousRecipeCacheMixin,
+                    viewsets.ModelViewSet):
     """Обрабатывает запросы к рецептам."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
@@ -132,9 +206,62 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_permissions(self):
+        """Изменять и удалять рецепт может только его автор."""
+        permissions = super().get_permissions()
+        if self.action in ('update', 'partial_update', 'destroy'):
+            permissions.append(IsRecipeAuthor())
+        return permissions
+
+    def get_queryset(self):
+        """
+        Возвращает рецепты со связанными объектами и отметками избранного
+        и списка покупок для действий, отдающих полный рецепт.
+        """
+        if self.action in ('list', 'retrieve', 'create',
+                           'update', 'partial_update'):
+            return Recipe.objects.for_user(self.request.user)
+        return Recipe.objects.all()
+
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Неизвестный формат списка покупок — ошибка запроса, а не 404,
+        который DRF отдаёт при неподходящем параметре format.
+        """
+        try:
+            return super().perform_content_negotiation(request, force)
+        except Http404:
+            if self.action != 'download_shopping_cart':
+                raise
+            formats = ', '.join(renderer.format
+                                for renderer in self.get_renderers())
+            raise ValidationError(
+                {'format': f'Неподдерживаемый формат. Доступны: {formats}.'}
+            )
+
     def perform_create(self, serializer):
         """Сохранить новый рецепт с автором как текущего пользователя. """
-        serializer.save(author=self.request.user)
+        with batch_invalidations():
+            recipe = serializer.save(author=self.request.user)
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_update(self, serializer):
+        """
+        Сохранить рецепт и подготовить его к ответу. Кэш сбрасывается
+        один раз на рецепт, а не на каждый заменённый ингредиент.
+        """
+        with batch_invalidations():
+            recipe = serializer.save()
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """
+        Удалить рецепт. Вклад рецепта в списки покупок вычитается
+        сигналом pre_delete.
+        """
+        with batch_counters(), batch_invalidations():
+            instance.delete()
 
     @action(detail=True, methods=['post'], url_path='favorite')
     def add_to_favorite(self, request, pk=None):
@@ -145,7 +272,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Рецепт уже в избранном.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        Favorite.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            Favorite.objects.create(user=user, recipe=recipe)
         serializer = RecipeShortSerializer(
             recipe,
             context={'request': request}
@@ -164,7 +292,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             raise ValidationError({'error': 'Рецепт не в избранном.'},
                                   code=status.HTTP_400_BAD_REQUEST)
 
-        favorite_item.delete()
+        with transaction.atomic():
+            favorite_item.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post'])
@@ -176,7 +305,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Рецепт уже в списке покупок.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        ShoppingCart.objects.create(user=user, recipe=recipe)
+        with transaction.atomic():
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+            add_recipe_to_shopping_list(user, recipe)
 
         serializer = RecipeShortSerializer(recipe,
                                            context={'request': request})
@@ -193,73 +324,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
             raise ValidationError({'error': 'Рецепт не в списке покупок.'},
                                   code=status.HTTP_400_BAD_REQUEST)
 
-        shopping_cart_item.delete()
+        with transaction.atomic():
+            shopping_cart_item.delete()
+            remove_recipe_from_shopping_list(user, recipe)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'], url_path='download_shopping_cart',
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer,
+                              ShoppingListJSONRenderer])
     def download_shopping_cart(self, request):
-        """Скачать список ингредиентов из списка покупок."""
-        user = request.user
-        shopping_cart = user.shopping_cart.select_related('recipe')
-
-        ingredients = {}
-        for item in shopping_cart:
-            recipe_ingredients = RecipeIngredient.objects.filter(
-                recipe=item.recipe).select_related('ingredient')
-            for recipe_ingredient in recipe_ingredients:
-                ingredient = recipe_ingredient.ingredient
-                name = ingredient.name
-                amount = recipe_ingredient.amount
-                unit = ingredient.measurement_unit
-
-                if name in ingredients:
-                    ingredients[name]['amount'] += amount
-                else:
-                    ingredients[name] = {'amount': amount, 'unit': unit}
-
-        response = HttpResponse(content_type='text/plain')
+        """
+        Скачать список ингредиентов из списка покупок.
+        Формат выбирается параметром format (txt, csv или json)
+        или заголовком Accept, по умолчанию txt. Строки читаются из базы
+        здесь: под ASGI Django перебирает потоковый ответ в цикле событий,
+        где запросы к базе запрещены.
+        """
+        renderer = request.accepted_renderer
+        rows = list(get_shopping_list(request.user))
+
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.txt"'
+            f'attachment; filename="shopping_cart.{renderer.format}"'
         )
-
-        sorted_ingredients = sorted(ingredients.items(), key=lambda x: x[0])
-
-        for name, data in sorted_ingredients:
-            response.write(f"{name} - {data['amount']} {data['unit']}\n")
-
         return response
 
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Получить рецепты авторов из подписок, от новых к старым.
+        Id рецептов берутся из заранее собранной ленты пользователя;
+        если в ней остались удалённые рецепты, страница дополняется
+        следующими.
+        """
+        paginator = TimelinePagination()
+        page_size = paginator.get_page_size(request)
+        cursor = paginator.get_cursor(request)
+        missing = set()
+        while True:
+            page = get_feed_page(request.user, cursor, page_size, missing)
+            recipe_ids = page[:page_size]
+            recipes = Recipe.objects.for_user(request.user).in_bulk(
+                recipe_ids
+            )
+            stale = set(recipe_ids) - recipes.keys()
+            if not stale:
+                break
+            missing |= stale
+        discard_missing(request.user.id, missing)
+        serializer = self.get_serializer(
+            [recipes[id] for id in recipe_ids if id in recipes], many=True
+        )
+        next_link = (paginator.get_next_link(request, recipe_ids[-1])
+                     if len(page) > page_size else None)
+        return paginator.get_paginated_response(serializer.data, next_link)
+
     @action(detail=True, methods=['get'])
     def get_short_link(self, request, pk=None):
         """Получить короткую ссылку на рецепт."""
         recipe = self.get_object()
-        short_link = f'{settings.BASE_URL}api/s/{encode_id(recipe.id)}'
+        short_link = request.build_absolute_uri(
+            reverse('recipe_detail', args=[encode_id(recipe.id)])
+        )
 
         return Response({'short-link': short_link})
 
-    @action(detail=False, methods=['get'])
-    def redirect_to_recipe(self, request, encoded_id):
-        """Перенаправить на рецепт по закодированному ID."""
-        recipe = get_object_or_404(Recipe, id=decode_id(encoded_id))
-
-        return redirect(f'{settings.BASE_URL}recipes/{recipe.id}')
-
-    def update(self, request, *args, **kwargs):
-        """Обновить рецепт."""
-        recipe = self.get_object()
-        if request.user != recipe.author:
-            return Response(
-                {'error': 'Вы не можете обновлять чужой рецепт.'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        return super().update(request, *args, **kwargs)
 
-    def destroy(self, request, *args, **kwargs):
-        """Удалить рецепт."""
-        recipe = self.get_object()
-        if request.user != recipe.author:
-            return Response(
-                {'error': 'Вы не можете удалять чужой рецепт.'},
-                status=status.HTTP_403_FORBIDDEN)
-        return super().destroy(request, *args, **kwargs)
+@require_GET
+def redirect_to_recipe(request, encoded_id):
+    """
+    Перенаправить на рецепт по закодированному ID.
+    Обычное представление Django без аутентификации и прав DRF.
+    """
+    try:
+        recipe_id = decode_id(encoded_id)
+    except ValueError:
+        raise Http404
+    if not Recipe.objects.filter(id=recipe_id).exists():
+        raise Http404
+    return redirect(f'{settings.BASE_URL}recipes/{recipe_id}')
+
+
+@require_GET
+def metrics(request):
+    """
+    Отдать метрики запросов всех процессов в текстовом формате Prometheus.
+    Маршрут не проксируется nginx и доступен только внутри сети сервисов.
+    """
+    return HttpResponse(
+        render_metrics(*registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
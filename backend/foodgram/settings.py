@@ -6,10 +6,33 @@ from dotenv import load_dotenv
 
 BASE_URL = 'http://richi-host.zapto.org/'
 DEFAULT_PAGE_SIZE = 6
+MAX_PAGE_SIZE = 100
+APPROXIMATE_PAGE_COUNT = True
 MIN_AMOUNT = 1
 MAX_AMOUNT = 32_000
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 32_000
+INGREDIENT_SEARCH_LIMIT = 50
+REFERENCE_DATA_MAX_AGE = 3600
+IMAGE_MAX_BYTES = 5 * 1024 * 1024
+IMAGE_MAX_PIXELS = 25_000_000
+IMAGE_RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+}
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITION_WORKERS = 2
+SEARCH_CONFIG = 'russian'
+FEED_STORAGE = 'api.feed.CacheTimelineStorage'
+FEED_CACHE = 'default'
+VERSION_CACHE = 'versions'
+FEED_TIMEOUT = 24 * 60 * 60
+FEED_MAX_LENGTH = 500
+RECIPE_RESPONSE_CACHE_TIMEOUT = 60
+METRICS_ENABLED = True
+METRICS_DIR = '/tmp/foodgram_metrics'
+METRICS_FLUSH_INTERVAL = 1
+ASYNC_DB_THREADS = 16
 
 load_dotenv()
 
@@ -20,6 +43,8 @@ SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'default_secret_key')
 
 DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',')
 
 
@@ -39,6 +64,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,6 +106,41 @@ DATABASES = {
     }
 }
 
+# Основной кэш — memcached, общий для всех воркеров: ленты и ответы
+# рецептов пишутся в него постоянно. FileBasedCache, если задать его через
+# CACHE_BACKEND, при каждой записи перечисляет каталог кэша, чтобы решить,
+# пора ли чистить, поэтому годится только с небольшим CACHE_MAX_ENTRIES.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.memcached.PyMemcacheCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+        'OPTIONS': (
+            {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 1000))}
+            if os.getenv('CACHE_BACKEND', '').endswith('FileBasedCache')
+            else {}
+        ),
+    },
+    # Версии справочников и поколения ответов: ключи без срока жизни,
+    # которые нельзя вытеснять, а memcached вытесняет их при нехватке
+    # памяти. Поэтому они в отдельном файловом кэше; ключей в нём
+    # единицы, и перечисление каталога при записи дёшево.
+    VERSION_CACHE: {
+        'BACKEND': os.getenv(
+            'VERSION_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('VERSION_CACHE_LOCATION',
+                              '/tmp/foodgram_versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1_000_000,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -120,6 +181,8 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DATA_UPLOAD_MAX_MEMORY_SIZE = 8 * 1024 * 1024
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
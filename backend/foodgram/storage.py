@@ -0,0 +1,68 @@
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import TransactionManagementError
+
+
+def lock_file_name(name, using=DEFAULT_DB_ALIAS):
+    """
+    Берёт advisory-блокировку PostgreSQL на имя файла до конца текущей
+    транзакции. Сохранение файла и удаление его же файла без ссылок
+    выполняются под ней по очереди. Вне транзакции блокировка
+    снялась бы сразу после запроса, поэтому вызывающий код обязан
+    открыть её сам.
+    """
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            'lock_file_name requires an open transaction: wrap the save '
+            'of the file reference in transaction.atomic().'
+        )
+    if connection.vendor != 'postgresql':
+        return
+    key = int(hashlib.sha256(name.encode()).hexdigest()[:15], 16)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, сохраняющее файлы под SHA-256 их содержимого.
+    Одинаковые файлы хранятся один раз, а их адреса не меняются,
+    поэтому их можно кэшировать бессрочно. Существующий файл не
+    перезаписывается; блокировка имени держится до фиксации транзакции,
+    в которой сохраняется ссылка на файл, поэтому параллельное удаление
+    файла без ссылок либо дождётся её и увидит ссылку, либо закончится
+    раньше, и файл будет записан заново.
+    """
+
+    def get_content_name(self, name, content):
+        """Имя, под которым будет сохранено содержимое файла."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        directory, filename = posixpath.split(name)
+        ext = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest.hexdigest()[:2], digest.hexdigest() + ext
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.get_content_name(name, content)
+        lock_file_name(name)
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+
+content_storage = ContentAddressedStorage()
@@ -0,0 +1,15 @@
+"""
+Настройки gunicorn. SERVER_MODE=asgi запускает воркеры uvicorn
+с асинхронными представлениями чтения, по умолчанию — синхронные
+воркеры WSGI.
+"""
+import os
+
+bind = '0.0.0.0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'foodgram.asgi:application'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
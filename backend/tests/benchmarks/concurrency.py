@@ -0,0 +1,199 @@
+"""
+Нагрузочный замер запущенного сервера: пропускная способность и задержки
+эндпоинтов чтения при разном числе одновременных запросов.
+
+Сервер запускается с одним воркером в каждом режиме, например:
+
+    SERVER_MODE=wsgi gunicorn
+    SERVER_MODE=asgi gunicorn
+
+и замеряется одной и той же командой с разными --label:
+
+    python -m tests.benchmarks.concurrency --url http://127.0.0.1:8000 \\
+        --label sync --json concurrency-sync.json
+    python -m tests.benchmarks.concurrency --url http://127.0.0.1:8000 \\
+        --label async --json concurrency-async.json \\
+        --compare concurrency-sync.json
+
+Базовые результаты лежат в tests/benchmarks/results.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from .stats import percentile
+
+ENDPOINTS = (
+    ('recipes-list', '/api/recipes/'),
+    ('recipes-detail', '/api/recipes/{recipe_id}/'),
+    ('tags-list', '/api/tags/'),
+    ('ingredients-search', '/api/ingredients/?name={ingredient}'),
+    ('short-link', '{short_link}'),
+)
+
+
+class Client:
+    """HTTP-клиент одного потока нагрузки с переиспользованием соединения."""
+
+    def __init__(self, url, token=None):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname,
+                                                     parts.port or 80,
+                                                     timeout=30)
+        self.headers = {'Authorization': f'Token {token}'} if token else {}
+
+    def get(self, path):
+        try:
+            self.connection.request('GET', path, headers=self.headers)
+            response = self.connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+        return response.status, body
+
+    def get_json(self, path):
+        status, body = self.get(path)
+        if status != 200:
+            raise RuntimeError(f'GET {path} returned {status}')
+        return json.loads(body)
+
+
+def get_paths(url, token):
+    """Подставляет в ENDPOINTS id существующего рецепта и его ссылку."""
+    client = Client(url, token)
+    recipes = client.get_json('/api/recipes/?limit=1')['results']
+    if not recipes:
+        raise RuntimeError('No recipes: run the seed_data command first')
+    recipe_id = recipes[0]['id']
+    ingredient = quote(recipes[0]['ingredients'][0]['name'][:3])
+    short_link = urlsplit(client.get_json(
+        f'/api/recipes/{recipe_id}/get-link/')['short-link']).path
+    values = {'recipe_id': recipe_id, 'short_link': short_link,
+              'ingredient': ingredient}
+    return {name: path.format(**values) for name, path in ENDPOINTS}
+
+
+def run_load(url, token, path, concurrency, duration):
+    """
+    concurrency потоков непрерывно запрашивают path в течение duration
+    секунд. Возвращает пропускную способность, задержки и число ошибок.
+    """
+    timings = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        client = Client(url, token)
+        local_timings = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status, _ = client.get(path)
+            except (OSError, http.client.HTTPException):
+                status = None
+            if status is None or status >= 400:
+                local_errors += 1
+            else:
+                local_timings.append(time.perf_counter() - started)
+        with lock:
+            timings.extend(local_timings)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if not timings:
+        return {'rps': 0, 'p50_ms': None, 'p95_ms': None,
+                'errors': errors[0]}
+    return {
+        'rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'errors': errors[0],
+    }
+
+
+def format_change(current, baseline):
+    if not baseline or current is None:
+        return ''
+    return f' ({(current - baseline) / baseline:+.0%})'
+
+
+def print_report(report, baseline):
+    print(f'{report["label"]}: {report["url"]}, '
+          f'{report["duration"]}s per measurement')
+    print(f'{"endpoint":<24}{"concurrency":>12}{"req/s":>18}'
+          f'{"p50, ms":>18}{"p95, ms":>18}{"errors":>8}')
+    for name, levels in report['results'].items():
+        for concurrency, result in levels.items():
+            previous = baseline.get(name, {}).get(concurrency, {})
+            columns = [
+                f'{result[key]}{format_change(result[key], previous.get(key))}'
+                for key in ('rps', 'p50_ms', 'p95_ms')
+            ]
+            print(f'{name:<24}{concurrency:>12}{columns[0]:>18}'
+                  f'{columns[1]:>18}{columns[2]:>18}{result["errors"]:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://127.0.0.1:8000',
+                        help='Server under test')
+    parser.add_argument('--label', default='server',
+                        help='Name of the measured mode, e.g. sync or async')
+    parser.add_argument('--concurrency', default='1,8,32',
+                        help='Comma-separated numbers of parallel clients')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Seconds per endpoint and concurrency level')
+    parser.add_argument('--warmup', type=float, default=2,
+                        help='Warmup seconds per endpoint')
+    parser.add_argument('--token',
+                        help='Auth token; without it anonymous responses '
+                             'may come from the response cache')
+    parser.add_argument('--endpoints',
+                        help='Comma-separated endpoint names to measure')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--compare', help='Results file to compare with')
+    args = parser.parse_args()
+
+    paths = get_paths(args.url, args.token)
+    if args.endpoints:
+        paths = {name: paths[name] for name in args.endpoints.split(',')}
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    results = {}
+    for name, path in paths.items():
+        run_load(args.url, args.token, path, max(levels), args.warmup)
+        results[name] = {
+            str(level): run_load(args.url, args.token, path, level,
+                                 args.duration)
+            for level in levels
+        }
+    report = {'label': args.label, 'url': args.url,
+              'duration': args.duration, 'results': results}
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import json
+import platform
+import time
+
+import django
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from .dataset import DatasetConfig, build_dataset
+from .stats import percentile
+
+RESULTS = {}
+
+
+@pytest.fixture(scope='session')
+def benchmark_dataset(request, django_db_setup, django_db_blocker):
+    """
+    Синтетический набор данных, общий для всех замеров сессии.
+    Строится в транзакции, которая откатывается после замеров,
+    чтобы данные не попали в остальные тесты.
+    """
+    config = DatasetConfig.parse(request.config.getoption('--benchmark-size'))
+    with django_db_blocker.unblock():
+        atomic = transaction.atomic()
+        atomic.__enter__()
+        try:
+            user_ids = build_dataset(config)
+            yield {'config': config, 'user_ids': user_ids}
+        finally:
+            transaction.set_rollback(True)
+            atomic.__exit__(None, None, None)
+
+
+@pytest.fixture
+def benchmark_db(benchmark_dataset, db):
+    """Доступ к базе с набором данных внутри замера."""
+    return benchmark_dataset
+
+
+def record_result(name, timings, queries):
+    RESULTS[name] = {
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'queries': queries,
+        'rounds': len(timings),
+    }
+
+
+def consume(response):
+    """Дочитывает ответ, чтобы в замер попала потоковая отдача."""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+@pytest.fixture
+def measure(request, benchmark_db):
+    """
+    Замеряет запрос к API: прогревочные запросы, один запрос с подсчётом
+    SQL и rounds запросов с замером времени без подсчёта.
+    """
+    warmup = request.config.getoption('--benchmark-warmup')
+    rounds = request.config.getoption('--benchmark-rounds')
+
+    def measure(name, client, url):
+        for _ in range(warmup):
+            assert consume(client.get(url)).status_code == 200
+        with CaptureQueriesContext(connection) as context:
+            consume(client.get(url))
+        queries = len(context.captured_queries)
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            consume(client.get(url))
+            timings.append(time.perf_counter() - started)
+        record_result(name, timings, queries)
+
+    return measure
+
+
+def format_change(current, baseline):
+    if not baseline:
+        return ''
+    return f' ({(current - baseline) / baseline:+.0%})'
+
+
+def pytest_sessionfinish(session):
+    if not RESULTS:
+        return
+    config = DatasetConfig.parse(session.config.getoption('--benchmark-size'))
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'dataset': config.as_dict(),
+        'results': dict(sorted(RESULTS.items())),
+    }
+    with open(session.config.getoption('--benchmark-json'), 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not RESULTS:
+        return
+    baseline = {}
+    compare = config.getoption('--benchmark-compare')
+    if compare:
+        with open(compare) as file:
+            baseline = json.load(file)['results']
+
+    terminalreporter.section('API benchmarks')
+    terminalreporter.write_line(
+        f'{"endpoint":<32}{"p50, ms":>20}{"p95, ms":>20}{"queries":>14}'
+    )
+    for name, result in sorted(RESULTS.items()):
+        previous = baseline.get(name, {})
+        p50 = (f'{result["p50_ms"]:.1f}'
+               f'{format_change(result["p50_ms"], previous.get("p50_ms"))}')
+        p95 = (f'{result["p95_ms"]:.1f}'
+               f'{format_change(result["p95_ms"], previous.get("p95_ms"))}')
+        queries = str(result['queries'])
+        if 'queries' in previous and previous['queries'] != result['queries']:
+            queries += f' (was {previous["queries"]})'
+        terminalreporter.write_line(f'{name:<32}{p50:>20}{p95:>20}'
+                                    f'{queries:>14}')
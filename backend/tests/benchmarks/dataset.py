@@ -0,0 +1,134 @@
+"""Синтетический набор данных для замеров производительности API."""
+import random
+from dataclasses import asdict, dataclass, fields
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                        ShoppingCart, Subscription, Tag)
+
+User = get_user_model()
+
+PREFIX = 'bench'
+
+
+@dataclass
+class DatasetConfig:
+    """Размеры набора данных; все значения задаются опцией --benchmark-size."""
+    users: int = 50
+    recipes_per_user: int = 10
+    ingredients: int = 500
+    ingredients_per_recipe: int = 8
+    tags: int = 6
+    tags_per_recipe: int = 2
+    favorites_per_user: int = 20
+    cart_per_user: int = 5
+    subscriptions_per_user: int = 10
+    seed: int = 0
+
+    @classmethod
+    def parse(cls, value):
+        """Разбирает строку вида "users=200,recipes_per_user=20"."""
+        names = {field.name for field in fields(cls)}
+        options = {}
+        for item in filter(None, (value or '').split(',')):
+            name, _, number = item.partition('=')
+            name = name.strip()
+            if name not in names:
+                raise ValueError(f'Unknown dataset option: {name}')
+            options[name] = int(number)
+        return cls(**options)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def build_dataset(config, batch_size=1000):
+    """
+    Строит набор данных пачками через bulk_create с фиксированным
+    зерном генератора, затем пересчитывает производные данные:
+    счётчики и итоги списков покупок. Возвращает id пользователей.
+    """
+    rng = random.Random(config.seed)
+
+    User.objects.bulk_create(
+        (User(email=f'{PREFIX}{i}@example.com', username=f'{PREFIX}{i}',
+              first_name='Имя', last_name='Фамилия')
+         for i in range(config.users)),
+        batch_size=batch_size
+    )
+    user_ids = list(User.objects.filter(
+        username__startswith=PREFIX).order_by('id').values_list(
+        'id', flat=True))
+
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {i}', slug=f'{PREFIX}-tag-{i}')
+        for i in range(config.tags)
+    )
+    tag_ids = list(Tag.objects.filter(
+        slug__startswith=PREFIX).values_list('id', flat=True))
+
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=f'{PREFIX} ингредиент {i}', measurement_unit='г')
+         for i in range(config.ingredients)),
+        batch_size=batch_size
+    )
+    ingredient_ids = list(Ingredient.objects.filter(
+        name__startswith=PREFIX).values_list('id', flat=True))
+
+    Recipe.objects.bulk_create(
+        (Recipe(author_id=author_id, name=f'Рецепт {author_id}-{i}',
+                text='Описание рецепта', cooking_time=rng.randint(5, 120))
+         for author_id in user_ids
+         for i in range(config.recipes_per_user)),
+        batch_size=batch_size
+    )
+    recipe_ids = list(Recipe.objects.filter(
+        author_id__in=user_ids).values_list('id', flat=True))
+
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                          amount=rng.randint(1, 500))
+         for recipe_id in recipe_ids
+         for ingredient_id in rng.sample(
+             ingredient_ids,
+             min(config.ingredients_per_recipe, len(ingredient_ids)))),
+        batch_size=batch_size
+    )
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+         for recipe_id in recipe_ids
+         for tag_id in rng.sample(tag_ids,
+                                  min(config.tags_per_recipe, len(tag_ids)))),
+        batch_size=batch_size
+    )
+
+    def sample_recipes(count):
+        return rng.sample(recipe_ids, min(count, len(recipe_ids)))
+
+    Favorite.objects.bulk_create(
+        (Favorite(user_id=user_id, recipe_id=recipe_id)
+         for user_id in user_ids
+         for recipe_id in sample_recipes(config.favorites_per_user)),
+        batch_size=batch_size
+    )
+    ShoppingCart.objects.bulk_create(
+        (ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+         for user_id in user_ids
+         for recipe_id in sample_recipes(config.cart_per_user)),
+        batch_size=batch_size
+    )
+    Subscription.objects.bulk_create(
+        (Subscription(user_id=user_id, author_id=author_id)
+         for user_id in user_ids
+         for author_id in rng.sample(
+             [id for id in user_ids if id != user_id],
+             min(config.subscriptions_per_user, len(user_ids) - 1))),
+        batch_size=batch_size
+    )
+
+    call_command('rebuild_shopping_lists', stdout=StringIO())
+    call_command('reconcile_counters', stdout=StringIO())
+    return user_ids
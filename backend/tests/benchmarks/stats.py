@@ -0,0 +1,8 @@
+"""Статистика замеров без зависимостей от Django."""
+import math
+
+
+def percentile(values, fraction):
+    """Перцентиль методом ближайшего ранга."""
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * fraction) - 1)]
@@ -0,0 +1,49 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from api.models import Recipe
+
+User = get_user_model()
+
+pytestmark = pytest.mark.benchmark
+
+ENDPOINTS = (
+    ('recipes-list', '/api/recipes/'),
+    ('recipes-list-page-2', '/api/recipes/?page=2'),
+    ('recipes-list-favorited', '/api/recipes/?is_favorited=1'),
+    ('recipes-list-in-cart', '/api/recipes/?is_in_shopping_cart=1'),
+    ('recipes-detail', '/api/recipes/{recipe_id}/'),
+    ('recipes-feed', '/api/recipes/feed/'),
+    ('subscriptions-list', '/api/users/subscriptions/'),
+    ('subscriptions-list-recipes-limit',
+     '/api/users/subscriptions/?recipes_limit=3'),
+    ('users-list', '/api/users/'),
+    ('tags-list', '/api/tags/'),
+    ('ingredients-search', '/api/ingredients/?name=bench'),
+    ('download-shopping-cart-txt', '/api/recipes/download_shopping_cart/'),
+    ('download-shopping-cart-csv',
+     '/api/recipes/download_shopping_cart/?format=csv'),
+)
+
+
+@pytest.fixture
+def reader_client(benchmark_db):
+    """
+    Клиент первого пользователя набора данных. Запросы авторизованы,
+    поэтому не попадают в кэш ответов для анонимов.
+    """
+    client = APIClient()
+    client.force_authenticate(
+        User.objects.get(pk=benchmark_db['user_ids'][0])
+    )
+    return client
+
+
+@pytest.mark.parametrize('name, url', ENDPOINTS,
+                         ids=[name for name, _ in ENDPOINTS])
+def test_endpoint(measure, reader_client, benchmark_db, name, url):
+    recipe_id = Recipe.objects.filter(
+        author_id__in=benchmark_db['user_ids']
+    ).order_by('id').values_list('id', flat=True).first()
+    measure(name, reader_client, url.format(recipe_id=recipe_id))
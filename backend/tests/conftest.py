@@ -0,0 +1,109 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.test import APIClient
+
+from api.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                        ShoppingCart, Subscription, Tag)
+from api.shopping_list import add_recipe_to_shopping_list
+
+User = get_user_model()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark', 'API benchmarks')
+    group.addoption('--benchmark', action='store_true',
+                    help='Run benchmarks from tests/benchmarks')
+    group.addoption('--benchmark-size', default='',
+                    help='Dataset sizes, e.g. users=200,recipes_per_user=20')
+    group.addoption('--benchmark-rounds', type=int, default=30,
+                    help='Timed requests per endpoint')
+    group.addoption('--benchmark-warmup', type=int, default=3,
+                    help='Untimed requests per endpoint')
+    group.addoption('--benchmark-json', default='benchmark.json',
+                    help='File to write results to')
+    group.addoption('--benchmark-compare', default=None,
+                    help='Baseline JSON file to compare results with')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    skip = pytest.mark.skip(reason='benchmarks run only with --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    """Кэш, версии и ленты в памяти процесса, отдельные для каждого теста."""
+    settings.CACHES = {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': alias,
+        }
+        for alias in ('default', settings.VERSION_CACHE)
+    }
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+@pytest.fixture
+def dataset(db):
+    """Небольшой набор данных: авторы, теги, ингредиенты, рецепты."""
+    users = [
+        User.objects.create(email=f'user{i}@example.com',
+                            username=f'user{i}',
+                            first_name='Имя', last_name='Фамилия')
+        for i in range(4)
+    ]
+    tags = [
+        Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}')
+        for i in range(3)
+    ]
+    ingredients = [
+        Ingredient.objects.create(name=f'Ингредиент {i}',
+                                  measurement_unit='г')
+        for i in range(20)
+    ]
+    recipes = [
+        Recipe.objects.create(author=users[i % len(users)],
+                              name=f'Рецепт {i}',
+                              text='Описание', cooking_time=10)
+        for i in range(24)
+    ]
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe,
+                         ingredient=ingredients[(i + j) % len(ingredients)],
+                         amount=j + 1)
+        for i, recipe in enumerate(recipes)
+        for j in range(3)
+    )
+    for i, recipe in enumerate(recipes):
+        recipe.tags.set([tags[i % len(tags)]])
+
+    reader = users[0]
+    for author in users[1:]:
+        Subscription.objects.create(user=reader, author=author)
+    for recipe in recipes[::3]:
+        Favorite.objects.create(user=reader, recipe=recipe)
+    for recipe in recipes[::4]:
+        ShoppingCart.objects.create(user=reader, recipe=recipe)
+        add_recipe_to_shopping_list(reader, recipe)
+
+    return {
+        'users': users,
+        'tags': tags,
+        'ingredients': ingredients,
+        'recipes': recipes,
+        'reader': reader,
+    }
+
+
+@pytest.fixture
+def reader_client(dataset):
+    """Клиент, авторизованный от имени читателя из набора данных."""
+    client = APIClient()
+    client.force_authenticate(dataset['reader'])
+    return client
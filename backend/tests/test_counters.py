@@ -0,0 +1,23 @@
+import pytest
+
+from api.models import Favorite, Recipe, Subscription
+
+
+@pytest.mark.django_db
+def test_full_save_does_not_overwrite_counters(dataset):
+    recipe = Recipe.objects.get(pk=dataset['recipes'][1].pk)
+    author = recipe.author
+    Favorite.objects.create(user=dataset['users'][2], recipe=recipe)
+    Subscription.objects.create(user=dataset['users'][2], author=author)
+
+    recipe.name = 'Новое название'
+    recipe.save()
+    author.first_name = 'Новое имя'
+    author.save()
+
+    recipe.refresh_from_db()
+    author.refresh_from_db()
+    assert recipe.name == 'Новое название'
+    assert recipe.favorites_count == recipe.favorites.count()
+    assert author.first_name == 'Новое имя'
+    assert author.followers_count == author.following.count()
@@ -0,0 +1,96 @@
+import pytest
+from rest_framework.test import APIClient
+
+from api import feed
+from api.models import Recipe, Subscription
+
+URL = '/api/recipes/feed/'
+
+
+def feed_ids(client, limit):
+    response = client.get(f'{URL}?limit={limit}')
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.data['results']]
+
+
+def expected_ids(user, limit):
+    return list(
+        Recipe.objects.filter(author__following__user=user)
+        .order_by('-id').values_list('id', flat=True)[:limit]
+    )
+
+
+@pytest.mark.django_db
+def test_feed_lists_recipes_of_followed_authors(reader_client, dataset):
+    assert feed_ids(reader_client, 6) == expected_ids(dataset['reader'], 6)
+
+
+@pytest.mark.django_db
+def test_feed_page_is_backfilled_after_stale_ids(reader_client, dataset):
+    reader = dataset['reader']
+    feed_ids(reader_client, 6)
+    Recipe.objects.filter(id__in=expected_ids(reader, 4)).delete()
+
+    assert feed_ids(reader_client, 6) == expected_ids(reader, 6)
+    assert feed.get_timeline_storage().get(reader.id)[:6] == (
+        expected_ids(reader, 6)
+    )
+
+
+@pytest.mark.django_db
+def test_deleting_author_rebuilds_each_feed_once(
+    dataset, settings, monkeypatch, django_capture_on_commit_callbacks
+):
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ]
+    author = dataset['users'][1]
+    author.set_password('password')
+    author.save(update_fields=['password'])
+    for user in dataset['users'][2:]:
+        Subscription.objects.create(user=author, author=user)
+        Subscription.objects.create(user=user, author=author)
+    rebuilt = []
+    monkeypatch.setattr(feed, 'build_timeline', rebuilt.append)
+    client = APIClient()
+    client.force_authenticate(author)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.delete(f'/api/users/{author.id}/',
+                                 {'current_password': 'password'})
+
+    assert response.status_code == 204
+    assert sorted(rebuilt) == sorted(
+        user.id for user in dataset['users'] if user != author
+    )
+
+
+@pytest.mark.django_db
+def test_new_recipe_is_pushed_to_followers_after_commit(
+    reader_client, dataset, django_capture_on_commit_callbacks
+):
+    reader = dataset['reader']
+    feed_ids(reader_client, 6)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe = Recipe.objects.create(author=dataset['users'][1],
+                                       name='Новый', cooking_time=5)
+
+    assert feed.get_timeline_storage().get(reader.id)[0] == recipe.id
+    assert feed_ids(reader_client, 6) == expected_ids(reader, 6)
+
+
+@pytest.mark.django_db
+def test_unsubscribing_removes_author_from_feed(
+    reader_client, dataset, django_capture_on_commit_callbacks
+):
+    reader, author = dataset['reader'], dataset['users'][1]
+    feed_ids(reader_client, 24)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = reader_client.delete(f'/api/users/{author.id}/subscribe/')
+
+    assert response.status_code == 204
+    ids = feed_ids(reader_client, 24)
+    assert ids == expected_ids(reader, 24)
+    assert not author.recipes.filter(id__in=ids).exists()
@@ -0,0 +1,157 @@
+import base64
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.db.transaction import TransactionManagementError
+
+from api import signals
+from api.images import generate_renditions, get_rendition_urls
+from api.models import Recipe
+from foodgram.storage import lock_file_name
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+    'AAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+@pytest.fixture
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    names = []
+    monkeypatch.setattr(signals, 'schedule_renditions', names.append)
+    return names
+
+
+@pytest.fixture
+def recipe(dataset, media):
+    recipe = dataset['recipes'][0]
+    recipe.image.save('photo.png', ContentFile(PNG))
+    return recipe
+
+
+@pytest.mark.django_db
+def test_rendition_urls_fall_back_to_original(recipe):
+    assert set(get_rendition_urls(recipe.image).values()) == {
+        recipe.image.url
+    }
+
+    assert generate_renditions(recipe.image.name) == 2
+
+    urls = get_rendition_urls(recipe.image)
+    assert recipe.image.url not in urls.values()
+    assert all(url.endswith('.webp') for url in urls.values())
+
+
+@pytest.mark.django_db
+def test_generate_renditions_skips_existing(recipe):
+    generate_renditions(recipe.image.name)
+
+    assert generate_renditions(recipe.image.name) == 0
+
+
+@pytest.mark.django_db
+def test_generate_renditions_ignores_broken_image(media):
+    name = default_storage.save('content/broken.png', ContentFile(b'oops'))
+
+    assert generate_renditions(name) == 0
+
+
+@pytest.mark.django_db
+def test_renditions_scheduled_only_for_new_file(recipe, scheduled):
+    recipe.save()
+    recipe.image.save('again.png', ContentFile(PNG))
+    assert scheduled == []
+
+    recipe.image.save('other.png', ContentFile(PNG + b'\0'))
+    assert scheduled == [recipe.image.name]
+
+
+@pytest.mark.django_db
+def test_generate_renditions_command(recipe):
+    out = StringIO()
+
+    call_command('generate_renditions', stdout=out)
+    call_command('generate_renditions', stdout=out)
+
+    assert out.getvalue().splitlines() == [
+        'Created 2 renditions for 1 images',
+        'Created 0 renditions for 1 images',
+    ]
+
+
+@pytest.mark.django_db
+def test_deleting_author_releases_recipe_images(
+    recipe, dataset, django_capture_on_commit_callbacks
+):
+    shared = dataset['recipes'][4]
+    shared.image = recipe.image.name
+    shared.save(update_fields=['image'])
+    name = recipe.image.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.delete()
+    assert default_storage.exists(name)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        shared.author.delete()
+    assert not default_storage.exists(name)
+
+
+@pytest.mark.django_db
+def test_replacing_image_releases_old_file(
+    recipe, django_capture_on_commit_callbacks
+):
+    old_name = recipe.image.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.image.save('other.png', ContentFile(PNG + b'\0'))
+
+    assert not default_storage.exists(old_name)
+    assert default_storage.exists(recipe.image.name)
+
+
+@pytest.mark.django_db
+def test_creating_recipe_does_not_release_upload_name(
+    dataset, media, monkeypatch, django_capture_on_commit_callbacks
+):
+    released = []
+    monkeypatch.setattr(signals, 'release_image', released.append)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipe.objects.create(
+            author=dataset['users'][0], name='Новый', cooking_time=5,
+            image=ContentFile(PNG, name='temp.png')
+        )
+
+    assert released == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lock_file_name_requires_transaction():
+    with pytest.raises(TransactionManagementError):
+        lock_file_name('content/ab/photo.png')
+
+    with transaction.atomic():
+        lock_file_name('content/ab/photo.png')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_avatar_saved_in_request_transaction(reader_client, dataset, media):
+    avatar = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+
+    response = reader_client.put('/api/users/me/avatar/', {'avatar': avatar},
+                                 format='json')
+
+    assert response.status_code == 200
+    dataset['reader'].refresh_from_db()
+    assert default_storage.exists(dataset['reader'].avatar.name)
@@ -0,0 +1,132 @@
+import json
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, F, Max
+
+from api.management.commands import load_ingredients
+from api.models import Ingredient, Recipe, ShoppingCartIngredient
+from api.shopping_list import calculate_shopping_lists
+
+User = get_user_model()
+
+INGREDIENTS = [
+    ('мука', 'г'),
+    ('молоко', 'мл'),
+    ('яйца', 'шт'),
+    ('соль, крупная', 'г'),
+]
+
+
+def write_file(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+
+def load(path, *args):
+    out = StringIO()
+    call_command('load_ingredients', path, *args, stdout=out)
+    return out.getvalue()
+
+
+def loaded():
+    return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+
+def as_csv(rows):
+    return ''.join(
+        f'"{name}",{unit}\n' if ',' in name else f'{name},{unit}\n'
+        for name, unit in rows
+    )
+
+
+def as_objects(rows):
+    return [{'name': name, 'measurement_unit': unit} for name, unit in rows]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, render', [
+    ('ingredients.csv', as_csv),
+    ('ingredients.json', lambda rows: json.dumps(as_objects(rows), indent=2,
+                                                 ensure_ascii=False)),
+    ('ingredients.json', lambda rows: '\n'.join(
+        json.dumps(item, ensure_ascii=False) for item in as_objects(rows))),
+    ('ingredients.ndjson', lambda rows: '\n'.join(
+        json.dumps(item, ensure_ascii=False) for item in as_objects(rows))),
+])
+def test_load_ingredients_formats(tmp_path, monkeypatch, name, render):
+    monkeypatch.setattr(load_ingredients, 'CHUNK_SIZE', 7)
+    path = write_file(tmp_path, name, render(INGREDIENTS))
+
+    output = load(path, '--batch-size', '3')
+
+    assert '4 inserted, 0 skipped' in output
+    assert loaded() == set(INGREDIENTS)
+
+
+@pytest.mark.django_db
+def test_load_ingredients_skips_existing(tmp_path):
+    Ingredient.objects.create(name='мука', measurement_unit='г')
+    path = write_file(tmp_path, 'ingredients.csv',
+                      as_csv(INGREDIENTS + INGREDIENTS[:1]))
+
+    output = load(path)
+
+    assert '3 inserted, 2 skipped' in output
+    assert loaded() == set(INGREDIENTS)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, args, error', [
+    ('ingredients.csv', ['--batch-size', '0'], '--batch-size'),
+    ('ingredients.xml', [], 'Unsupported file format: xml'),
+    ('ingredients.json', [], 'Error importing data'),
+])
+def test_load_ingredients_rejects_bad_input(tmp_path, name, args, error):
+    path = write_file(tmp_path, name, '[{"name": "мука"}]')
+
+    output = load(path, *args)
+
+    assert error in output
+    assert not Ingredient.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor == 'postgresql',
+                    reason='seed_data runs on PostgreSQL')
+def test_seed_data_requires_postgresql():
+    with pytest.raises(CommandError):
+        call_command('seed_data', stdout=StringIO())
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql',
+                    reason='seed_data writes with COPY')
+def test_seed_data_keeps_derived_data_consistent(dataset):
+    users_before = User.objects.count()
+    recipes_before = Recipe.objects.count()
+
+    call_command('seed_data', '--users', '20', '--recipes', '60',
+                 '--batch-size', '25', stdout=StringIO())
+
+    assert User.objects.count() == users_before + 20
+    assert Recipe.objects.count() == recipes_before + 60
+    assert not User.objects.annotate(
+        actual=Count('recipes', distinct=True)
+    ).exclude(recipes_count=F('actual')).exists()
+    assert not Recipe.objects.annotate(
+        actual=Count('favorites', distinct=True)
+    ).exclude(favorites_count=F('actual')).exists()
+    assert {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in
+        ShoppingCartIngredient.objects.values_list(
+            'user_id', 'ingredient_id', 'amount')
+    } == calculate_shopping_lists()
+    last_id = Recipe.objects.aggregate(Max('id'))['id__max']
+    created = Recipe.objects.create(author=dataset['reader'], name='Новый')
+    assert created.id > last_id
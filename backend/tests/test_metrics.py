@@ -0,0 +1,69 @@
+import asyncio
+import json
+import subprocess
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.metrics import registry
+from api.middleware import metrics_middleware
+
+
+@pytest.fixture
+def metrics_dir(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    return tmp_path
+
+
+def get_route_metrics(route):
+    for name, method, metrics in registry.snapshot()['routes']:
+        if (name, method) == (route, 'GET'):
+            return metrics
+    return {'count': 0, 'serializer_seconds': 0.0}
+
+
+@pytest.mark.django_db
+def test_serialization_time_is_recorded(reader_client, metrics_dir):
+    before = get_route_metrics('recipes-list')
+
+    assert reader_client.get('/api/recipes/').status_code == 200
+
+    after = get_route_metrics('recipes-list')
+    assert after['count'] == before['count'] + 1
+    assert after['serializer_seconds'] > before['serializer_seconds']
+
+
+def test_snapshots_of_finished_processes_are_absorbed(metrics_dir):
+    process = subprocess.Popen(['true'])
+    process.wait()
+    path = metrics_dir / f'{process.pid}.json'
+    path.write_text(json.dumps({
+        'routes': [],
+        'response_cache': {'dead-view': {'hits': 3, 'misses': 1}},
+    }))
+    (metrics_dir / f'{process.pid}.json.1.tmp').write_text('')
+
+    _, first = registry.collect()
+    _, second = registry.collect()
+
+    assert first['dead-view'] == {'hits': 3, 'misses': 1}
+    assert second['dead-view'] == {'hits': 3, 'misses': 1}
+    assert [child.name for child in metrics_dir.iterdir()] == [
+        registry.get_path().rsplit('/', 1)[1]
+    ]
+
+
+def test_middleware_supports_sync_and_async_handlers():
+    request = RequestFactory().get('/')
+
+    async def async_view(request):
+        return HttpResponse()
+
+    sync_middleware = metrics_middleware(lambda request: HttpResponse())
+    async_middleware = metrics_middleware(async_view)
+
+    assert not asyncio.iscoroutinefunction(sync_middleware)
+    assert asyncio.iscoroutinefunction(async_middleware)
+    assert sync_middleware(request).status_code == 200
+    assert asyncio.run(async_middleware(request)).status_code == 200
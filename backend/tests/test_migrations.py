@@ -0,0 +1,55 @@
+import pytest
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+USERS = ('users', '0002_content_addressed_images')
+MERGE_FROM = [('api', '0005_shoppingcartingredient'), USERS]
+MERGE_TO = [('api', '0006_ingredient_unique_ingredient'), USERS]
+
+
+def migrate(targets):
+    executor = MigrationExecutor(connection)
+    executor.loader.build_graph()
+    executor.migrate(targets)
+    return executor.loader.project_state(targets).apps
+
+
+@pytest.mark.django_db(transaction=True)
+def test_merging_ingredients_sums_recipe_amounts():
+    apps = migrate(MERGE_FROM)
+    User = apps.get_model('users', 'User')
+    Ingredient = apps.get_model('api', 'Ingredient')
+    Recipe = apps.get_model('api', 'Recipe')
+    RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+    author = User.objects.create(email='author@example.com',
+                                 username='author')
+    kept, duplicate, other = (
+        Ingredient.objects.create(name=name, measurement_unit='г')
+        for name in ('мука', 'мука', 'соль')
+    )
+    both, only_duplicate = (
+        Recipe.objects.create(author=author, name=name, text='',
+                              cooking_time=10)
+        for name in ('Блины', 'Оладьи')
+    )
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=both, ingredient=kept, amount=100),
+        RecipeIngredient(recipe=both, ingredient=duplicate, amount=50),
+        RecipeIngredient(recipe=both, ingredient=other, amount=5),
+        RecipeIngredient(recipe=only_duplicate, ingredient=duplicate,
+                         amount=70),
+    ])
+
+    try:
+        apps = migrate(MERGE_TO)
+        RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+        rows = set(RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id', 'amount'))
+    finally:
+        migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    assert rows == {
+        (both.id, kept.id, 150),
+        (both.id, other.id, 5),
+        (only_duplicate.id, kept.id, 70),
+    }
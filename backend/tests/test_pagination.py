@@ -0,0 +1,93 @@
+from urllib.parse import quote
+
+import pytest
+from django.db import connection
+
+from api.models import Recipe
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_all_recipes(reader_client, dataset):
+    url = '/api/recipes/?cursor=&limit=10'
+    seen = []
+    while url:
+        response = reader_client.get(url)
+        assert response.status_code == 200
+        seen.extend(recipe['id'] for recipe in response.data['results'])
+        url = response.data['next']
+
+    assert seen == sorted(
+        (recipe.id for recipe in dataset['recipes']), reverse=True
+    )
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_approximate_count(reader_client, dataset):
+    response = reader_client.get('/api/recipes/?cursor=&limit=5')
+
+    assert response.status_code == 200
+    assert len(response.data['results']) == 5
+    count = response.data['count']
+    if connection.vendor == 'postgresql':
+        assert isinstance(count, int)
+    else:
+        assert count is None
+
+
+@pytest.fixture
+def search_recipes(dataset):
+    """
+    Рецепты для поиска. Совпадение в названии весит больше, чем
+    в описании, поэтому порядок по релевантности обратен порядку по id.
+    """
+    author = dataset['users'][1]
+    return {
+        key: Recipe.objects.create(author=author, name=name, text=text,
+                                   cooking_time=10)
+        for key, name, text in (
+            ('borscht', 'Борщ украинский', 'Со сметаной'),
+            ('soup', 'Суп дня', 'Почти как борщ'),
+            ('pie', 'Пирог с капустой', 'Дрожжевое тесто'),
+        )
+    }
+
+
+def collect(client, url):
+    ids = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        ids.extend(recipe['id'] for recipe in response.data['results'])
+        url = response.data['next']
+    return ids
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql',
+                    reason='ранжирование есть только в PostgreSQL')
+@pytest.mark.parametrize('query', ['', '&cursor='])
+def test_search_pages_keep_rank_order(reader_client, search_recipes, query):
+    ids = collect(reader_client,
+                  f'/api/recipes/?search={quote("борщ")}&limit=1{query}')
+
+    assert ids == [search_recipes['borscht'].id, search_recipes['soup'].id]
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql',
+                    reason='синтаксис websearch есть только в PostgreSQL')
+@pytest.mark.parametrize('search, expected', [
+    ('борщи', ['borscht', 'soup']),
+    ('"борщ украинский"', ['borscht']),
+    ('борщ -суп', ['borscht']),
+    ('суп or пирог', ['soup', 'pie']),
+    ('капуста', ['pie']),
+])
+def test_search_websearch_syntax(reader_client, search_recipes, search,
+                                 expected):
+    response = reader_client.get('/api/recipes/', {'search': search})
+
+    assert response.status_code == 200
+    assert {recipe['id'] for recipe in response.data['results']} == {
+        search_recipes[key].id for key in expected
+    }
@@ -0,0 +1,63 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Recipe
+
+
+def count_recipe_reads(context):
+    return sum(
+        query['sql'].startswith('SELECT')
+        and 'FROM "api_recipe"' in query['sql']
+        for query in context.captured_queries
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('method, error', [
+    ('put', 'Вы не можете обновлять чужой рецепт.'),
+    ('patch', 'Вы не можете обновлять чужой рецепт.'),
+    ('delete', 'Вы не можете удалять чужой рецепт.'),
+])
+def test_only_author_changes_recipe(reader_client, dataset, method, error):
+    recipe = dataset['recipes'][1]
+    assert recipe.author != dataset['reader']
+
+    with CaptureQueriesContext(connection) as context:
+        response = getattr(reader_client, method)(
+            f'/api/recipes/{recipe.id}/', {'name': 'Чужой'}, format='json'
+        )
+
+    assert response.status_code == 403
+    assert response.json() == {'error': error}
+    assert count_recipe_reads(context) == 1
+    assert Recipe.objects.get(pk=recipe.pk).name == recipe.name
+
+
+@pytest.mark.django_db
+def test_author_updates_recipe_with_one_lookup(reader_client, dataset):
+    recipe = dataset['recipes'][0]
+    assert recipe.author == dataset['reader']
+
+    with CaptureQueriesContext(connection) as context:
+        response = reader_client.patch(f'/api/recipes/{recipe.id}/', {
+            'name': 'Новое',
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'tags': [dataset['tags'][0].id],
+            'ingredients': [{'id': dataset['ingredients'][0].id,
+                             'amount': 1}],
+        }, format='json')
+
+    assert response.status_code == 200
+    # get_object до сохранения и рецепт для ответа после него.
+    assert count_recipe_reads(context) == 2
+
+
+@pytest.mark.django_db
+def test_other_users_can_favorite_recipe(reader_client, dataset):
+    recipe = dataset['recipes'][2]
+
+    response = reader_client.post(f'/api/recipes/{recipe.id}/favorite/')
+
+    assert response.status_code == 201
@@ -0,0 +1,342 @@
+"""
+Бюджеты SQL-запросов для маршрутов api/urls.py.
+
+Каждый запрос выполняется дважды: на исходном наборе данных и после того,
+как у рецептов стало больше ингредиентов и тегов, у авторов — рецептов,
+у читателя — подписок, избранного и корзины, а страницы стали больше.
+Обработчики transaction.on_commit выполняются и входят в бюджет.
+Число запросов не должно меняться и не должно превышать бюджет,
+иначе тест выводит выполненные запросы.
+"""
+from collections import defaultdict, namedtuple
+from io import StringIO
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, resolve
+from rest_framework.test import APIClient
+
+from api import urls
+from api.encoding import encode_id
+from api.models import (Favorite, Recipe, RecipeIngredient, ShoppingCart,
+                        Subscription)
+from api.views import UserViewSet
+
+User = get_user_model()
+
+PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+       'AAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+PAGE_SIZES = (2, 6)
+# Каскадное удаление идёт пачками по 100 строк, поэтому строк одной модели
+# у удаляемого объекта должно быть меньше: иначе рост запросов ложный.
+INGREDIENTS_PER_RECIPE = 6
+NEW_RECIPES_PER_AUTHOR = 6
+NEW_AUTHORS = 4
+
+# Стандартные эндпоинты djoser из auth/ повторяют /api/users/.
+SKIPPED_URLCONFS = ('djoser.urls',)
+# Восстановление доступа и смена email по почте в проекте не используются.
+SKIPPED_ACTIONS = {
+    (UserViewSet, action) for action in (
+        'activation', 'resend_activation', 'reset_password',
+        'reset_password_confirm', 'reset_username',
+        'reset_username_confirm', 'set_username',
+    )
+}
+
+
+def as_reader(data, run):
+    return data['reader']
+
+
+def as_anonymous(data, run):
+    return None
+
+
+Budget = namedtuple('Budget', 'route method queries request user',
+                    defaults=(as_reader,))
+
+
+def recipe_payload(data, size):
+    return {
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 15,
+        'image': PNG,
+        'tags': [tag.id for tag in data['tags']],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': index + 1}
+            for index, ingredient in enumerate(data['ingredients'][:size])
+        ],
+    }
+
+
+def password(run):
+    return f'Pa$$word-{run}-budget'
+
+
+BUDGETS = (
+    Budget('api-root', 'get', 0, lambda data, run, size: ('/api/', None)),
+    Budget('users-list', 'get', 7, lambda data, run, size: (
+        f'/api/users/?limit={size}', None)),
+    Budget('users-list', 'post', 5, lambda data, run, size: (
+        '/api/users/', {'email': f'new{run}@example.com',
+                        'username': f'new{run}', 'first_name': 'Имя',
+                        'last_name': 'Фамилия', 'password': password(run)})),
+    Budget('users-detail', 'get', 5, lambda data, run, size: (
+        f'/api/users/{data["users"][1].id}/', None)),
+    Budget('users-detail', 'put', 11, lambda data, run, size: (
+        f'/api/users/{data["reader"].id}/',
+        {'email': f'reader{run}@example.com', 'username': f'reader{run}',
+         'first_name': 'Имя', 'last_name': 'Фамилия', 'avatar': PNG})),
+    Budget('users-detail', 'patch', 8, lambda data, run, size: (
+        f'/api/users/{data["reader"].id}/', {'first_name': f'Имя {run}'})),
+    Budget('users-detail', 'delete', 39, lambda data, run, size: (
+        f'/api/users/{data["users"][run + 1].id}/',
+        {'current_password': password(0)}),
+        lambda data, run: data['users'][run + 1]),
+    Budget('users-me', 'get', 1, lambda data, run, size: (
+        '/api/users/me/', None)),
+    Budget('users-set-password', 'post', 2, lambda data, run, size: (
+        '/api/users/set_password/', {'current_password': password(run),
+                                     'new_password': password(run + 1)})),
+    Budget('user-avatar-detail', 'put', 7, lambda data, run, size: (
+        '/api/users/me/avatar/', {'avatar': PNG})),
+    Budget('user-avatar-detail', 'delete', 1, lambda data, run, size: (
+        '/api/users/me/avatar/', None)),
+    Budget('user-subscriptions-list', 'get', 3, lambda data, run, size: (
+        f'/api/users/subscriptions/?limit={size}&recipes_limit={size}',
+        None)),
+    Budget('user-subscription-detail', 'post', 9, lambda data, run, size: (
+        f'/api/users/{data["spare_authors"][run].id}/subscribe/', None)),
+    Budget('user-subscription-detail', 'delete', 7, lambda data, run, size: (
+        f'/api/users/{data["users"][run + 1].id}/subscribe/', None)),
+    Budget('tags-list', 'get', 1, lambda data, run, size: (
+        '/api/tags/', None)),
+    Budget('tags-detail', 'get', 1, lambda data, run, size: (
+        f'/api/tags/{data["tags"][0].id}/', None)),
+    Budget('ingredients-list', 'get', 1, lambda data, run, size: (
+        '/api/ingredients/?name=Инг', None)),
+    Budget('ingredients-detail', 'get', 1, lambda data, run, size: (
+        f'/api/ingredients/{data["ingredients"][0].id}/', None)),
+    Budget('recipes-list', 'get', 5, lambda data, run, size: (
+        f'/api/recipes/?limit={size}', None)),
+    Budget('recipes-list', 'post', 17, lambda data, run, size: (
+        '/api/recipes/', recipe_payload(data, size))),
+    Budget('recipes-detail', 'get', 4, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][0].id}/', None)),
+    Budget('recipes-detail', 'put', 22, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][0].id}/',
+        recipe_payload(data, size))),
+    Budget('recipes-detail', 'patch', 22, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][0].id}/',
+        recipe_payload(data, size))),
+    Budget('recipes-detail', 'delete', 19, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][4 * run + 4].id}/', None)),
+    Budget('recipes-download-shopping-cart', 'get', 1,
+           lambda data, run, size: (
+               '/api/recipes/download_shopping_cart/', None)),
+    Budget('recipes-feed', 'get', 5, lambda data, run, size: (
+        f'/api/recipes/feed/?limit={size}', None)),
+    Budget('recipe-short-link', 'get', 1, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][0].id}/get-link/', None)),
+    Budget('recipe-shopping-cart', 'post', 8, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][4 * run + 1].id}/shopping_cart/',
+        None)),
+    Budget('recipe-shopping-cart', 'delete', 10, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][4 * run].id}/shopping_cart/', None)),
+    Budget('recipe-favorite', 'post', 6, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][3 * run + 1].id}/favorite/', None)),
+    Budget('recipe-favorite', 'delete', 7, lambda data, run, size: (
+        f'/api/recipes/{data["recipes"][3 * run].id}/favorite/', None)),
+    Budget('recipe_detail', 'get', 1, lambda data, run, size: (
+        f'/api/s/{encode_id(data["recipes"][run].id)}/', None)),
+    Budget('login', 'post', 6, lambda data, run, size: (
+        '/api/auth/token/login/', {'email': data['reader'].email,
+                                   'password': password(0)}), as_anonymous),
+    Budget('logout', 'post', 1, lambda data, run, size: (
+        '/api/auth/token/logout/', None)),
+)
+
+
+def get_view_key(callback, action=None):
+    """Ключ представления: класс вьюсета и действие или само представление."""
+    if hasattr(callback, 'actions'):
+        return callback.cls, action
+    return getattr(callback, 'view_class', callback), None
+
+
+def get_api_views(patterns):
+    """Все представления и действия из api/urls.py."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            urlconf = getattr(pattern.urlconf_name, '__name__', None)
+            if urlconf not in SKIPPED_URLCONFS:
+                yield from get_api_views(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            callback = pattern.callback
+            for action in getattr(callback, 'actions', {None: None}).values():
+                yield get_view_key(callback, action)
+
+
+def resolve_view_key(url, method):
+    match = resolve(url.split('?')[0])
+    return get_view_key(match.func,
+                        getattr(match.func, 'actions', {}).get(method))
+
+
+def add_to_lists(users, recipes):
+    """
+    Добавляет рецепты в избранное и корзину пользователей,
+    затем пересчитывает счётчики и итоги списков покупок.
+    """
+    for model in (Favorite, ShoppingCart):
+        model.objects.bulk_create(
+            (model(user=user, recipe=recipe)
+             for user in users for recipe in recipes),
+            ignore_conflicts=True
+        )
+    call_command('rebuild_shopping_lists', stdout=StringIO())
+    call_command('reconcile_counters', stdout=StringIO())
+
+
+def get_existing(users):
+    """Пользователи, которые не были удалены в первом прогоне."""
+    return list(User.objects.filter(pk__in=[user.pk for user in users]))
+
+
+def grow(data):
+    """
+    Увеличивает число связанных строк: ингредиентов и тегов рецептов,
+    рецептов авторов, подписок, избранного и корзин.
+    """
+    new_authors = [
+        User.objects.create(email=f'author{i}@example.com',
+                            username=f'author{i}',
+                            first_name='Имя', last_name='Фамилия')
+        for i in range(NEW_AUTHORS)
+    ]
+    authors = get_existing(data['users'] + data['spare_authors'])
+    new_recipes = [
+        Recipe.objects.create(author=author, name=f'Рецепт {author.id}-{i}',
+                              text='Описание', cooking_time=10)
+        for author in authors + new_authors
+        for i in range(NEW_RECIPES_PER_AUTHOR)
+    ]
+    for recipe in Recipe.objects.all():
+        existing = set(recipe.recipe_ingredients.values_list(
+            'ingredient_id', flat=True))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for ingredient in data['ingredients'][:INGREDIENTS_PER_RECIPE]
+            if ingredient.id not in existing
+        )
+        recipe.tags.set(data['tags'])
+    for author in new_authors:
+        Subscription.objects.create(user=data['reader'], author=author)
+    add_to_lists([data['reader']], new_recipes)
+    add_to_lists(get_existing(data['users'][1:]), Recipe.objects.all())
+
+
+@pytest.fixture
+def budget_data(dataset, settings, tmp_path):
+    """
+    Набор данных из conftest, в котором у рецептов уже есть избранное
+    и корзины других пользователей, а у авторов — подписчики.
+    """
+    settings.MEDIA_ROOT = tmp_path
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ]
+    users = dataset['users']
+    for user in users:
+        user.set_password(password(0))
+        user.save()
+    dataset['spare_authors'] = [
+        User.objects.create(email=f'spare{i}@example.com',
+                            username=f'spare{i}',
+                            first_name='Имя', last_name='Фамилия')
+        for i in range(len(PAGE_SIZES))
+    ]
+    for author in dataset['spare_authors']:
+        Recipe.objects.create(author=author, name='Рецепт',
+                              text='Описание', cooking_time=10)
+    for user in users[1:]:
+        for author in users[1:]:
+            if author != user:
+                Subscription.objects.create(user=user, author=author)
+    add_to_lists(users[1:], Recipe.objects.all())
+    return dataset
+
+
+def run_request(budget, data, run, size, capture_on_commit):
+    """
+    Выполняет запрос с холодными кэшами и возвращает выполненный SQL,
+    включая обработчики transaction.on_commit.
+    """
+    cache.clear()
+    url, payload = budget.request(data, run, size)
+    client = APIClient()
+    client.force_authenticate(budget.user(data, run))
+    kwargs = {} if payload is None else {'data': payload, 'format': 'json'}
+
+    with CaptureQueriesContext(connection) as context, \
+            capture_on_commit(execute=True):
+        response = getattr(client, budget.method)(url, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    assert response.status_code < 400, (
+        f'{budget.method.upper()} {url}: {response.status_code} '
+        f'{response.content[:500]}'
+    )
+    return [query['sql'] for query in context.captured_queries]
+
+
+def format_queries(queries):
+    return '\n'.join(f'{index}. {sql}'
+                     for index, sql in enumerate(queries, start=1))
+
+
+def test_every_api_route_has_budget():
+    """Новый маршрут или действие в api/urls.py требует своего бюджета."""
+    placeholder = SimpleNamespace(id=1, email='user@example.com')
+    data = defaultdict(lambda: [placeholder] * 10, reader=placeholder)
+    covered = {
+        resolve_view_key(budget.request(data, 0, 1)[0], budget.method)
+        for budget in BUDGETS
+    }
+    missing = set(get_api_views(urls.urlpatterns)) - SKIPPED_ACTIONS - covered
+    assert not missing, '\n'.join(
+        f'{view.__name__}.{action}' if action else view.__name__
+        for view, action in missing
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'budget', BUDGETS,
+    ids=[f'{budget.method.upper()} {budget.route}' for budget in BUDGETS]
+)
+def test_query_budget(budget_data, budget,
+                      django_capture_on_commit_callbacks):
+    counts = []
+    for run, size in enumerate(PAGE_SIZES):
+        if run:
+            grow(budget_data)
+        queries = run_request(budget, budget_data, run, size,
+                              django_capture_on_commit_callbacks)
+        counts.append(len(queries))
+        assert len(queries) <= budget.queries, (
+            f'{budget.method.upper()} {budget.route}: {len(queries)} '
+            f'queries, budget {budget.queries}\n{format_queries(queries)}'
+        )
+    assert counts[-1] <= counts[0], (
+        f'{budget.method.upper()} {budget.route}: query count grows with '
+        f'data, {counts}\n{format_queries(queries)}'
+    )
@@ -0,0 +1,168 @@
+"""
+Проверяет, что запросы основных эндпоинтов используют индексы.
+
+Планы строятся с enable_seqscan = off: если планировщику всё равно
+приходится читать таблицу целиком, подходящего индекса нет. На таблицах
+из нескольких строк планировщик предпочитает пройти индекс целиком,
+поэтому перед проверкой данных добавляется до объёма, при котором
+выбор индекса такой же, как в рабочей базе.
+Тесты выполняются только на PostgreSQL.
+"""
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.images import get_reference_count
+from api.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                        ShoppingCartIngredient, Subscription)
+
+User = get_user_model()
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='EXPLAIN проверяется только на PostgreSQL'
+)
+
+INDEX_SCANS = ('Index Scan', 'Index Only Scan')
+EXTRA_USERS = 300
+RECIPES_PER_USER = 10
+LINKS_PER_USER = 20
+# Эндпоинты, которые по смыслу отдают таблицу целиком.
+FULL_READS = {('/api/tags/', 'api_tag')}
+
+
+@pytest.fixture
+def volume(dataset):
+    """
+    Добавляет пользователей, рецепты, теги рецептов, связи и списки
+    покупок.
+    """
+    users = User.objects.bulk_create(
+        User(email=f'volume{i}@example.com', username=f'volume{i}')
+        for i in range(EXTRA_USERS)
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(author=user, name=f'Блюдо {user.id}-{i}', cooking_time=10)
+        for user in users for i in range(RECIPES_PER_USER)
+    )
+    tags = dataset['tags']
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe=recipe, tag=tags[i % len(tags)])
+        for i, recipe in enumerate(recipes)
+    )
+    for model, targets, field in ((Favorite, recipes, 'recipe'),
+                                  (ShoppingCart, recipes, 'recipe'),
+                                  (Subscription, users, 'author')):
+        model.objects.bulk_create(
+            model(user=user, **{field: targets[(i * 37 + j) % len(targets)]})
+            for i, user in enumerate(users)
+            for j in range(LINKS_PER_USER)
+            if targets[(i * 37 + j) % len(targets)] != user
+        )
+    ingredients = dataset['ingredients']
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user=user, ingredient=ingredients[(i + j) % len(ingredients)],
+            amount=j + 1
+        )
+        for i, user in enumerate(users)
+        for j in range(min(LINKS_PER_USER, len(ingredients)))
+    )
+    with connection.cursor() as cursor:
+        # Строки, добавленные в GIN-индекс, сначала копятся в списке
+        # ожидания, и планировщик считает такой индекс дорогим. В рабочей
+        # базе список переносит в индекс autovacuum.
+        cursor.execute(
+            "SELECT gin_clean_pending_list(c.oid) FROM pg_class c "
+            "JOIN pg_am am ON am.oid = c.relam WHERE am.amname = 'gin'"
+        )
+        cursor.execute('ANALYZE')
+    return dataset
+
+
+def get_endpoints(dataset):
+    recipe = dataset['recipes'][0]
+    author = dataset['users'][1]
+    return [
+        '/api/recipes/',
+        '/api/recipes/?cursor=',
+        f'/api/recipes/?author={author.id}',
+        f'/api/recipes/?tags={dataset["tags"][0].slug}',
+        '/api/recipes/?search=Рецепт&tags=tag0',
+        '/api/recipes/?is_favorited=1',
+        '/api/recipes/?is_in_shopping_cart=1',
+        f'/api/recipes/{recipe.id}/',
+        '/api/recipes/download_shopping_cart/',
+        '/api/users/',
+        f'/api/users/{author.id}/',
+        '/api/users/subscriptions/',
+        '/api/tags/',
+        '/api/ingredients/?name=Инг',
+    ]
+
+
+def get_plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from get_plan_nodes(child)
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+        return cursor.fetchone()[0][0]['Plan']
+
+
+def find_full_scans(sql):
+    """
+    Возвращает таблицы, которые план читает целиком: Seq Scan
+    и проход по индексу без условия, но с фильтром.
+    """
+    return [
+        (node['Node Type'], node['Relation Name'])
+        for node in get_plan_nodes(explain(sql))
+        if node['Node Type'] == 'Seq Scan'
+        or (node['Node Type'] in INDEX_SCANS
+            and 'Filter' in node and 'Index Cond' not in node)
+    ]
+
+
+@pytest.mark.django_db
+def test_endpoints_do_not_scan_tables(reader_client, volume):
+    problems = []
+    for url in get_endpoints(volume):
+        with CaptureQueriesContext(connection) as context:
+            response = reader_client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        assert response.status_code == 200, url
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            for node_type, table in find_full_scans(sql):
+                if (url, table) not in FULL_READS:
+                    problems.append(f'{url}: {node_type} on {table}\n'
+                                    f'    {sql}')
+
+    assert not problems, '\n'.join(problems)
+
+
+@pytest.mark.django_db
+def test_ingredient_prefix_search_uses_index(dataset):
+    queryset = Ingredient.objects.filter(name__istartswith='инг')
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        sql = cursor.mogrify(sql, params).decode()
+    assert not find_full_scans(sql)
+
+
+@pytest.mark.django_db
+def test_image_reference_count_uses_indexes(volume):
+    with CaptureQueriesContext(connection) as context:
+        get_reference_count('content/ab/missing.png')
+    assert len(context.captured_queries) == 2
+    for query in context.captured_queries:
+        assert not find_full_scans(query['sql']), query['sql']
@@ -0,0 +1,79 @@
+import base64
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import signals
+
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+    'AAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+def as_data_url(content):
+    return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+
+def get_payload(recipe, image=PNG):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': as_data_url(image),
+        'tags': [tag.id for tag in recipe.tags.all()],
+        'ingredients': [
+            {'id': item.ingredient_id, 'amount': item.amount}
+            for item in recipe.recipe_ingredients.all()
+        ],
+    }
+
+
+def get_writes(context):
+    return [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+    ]
+
+
+@pytest.fixture
+def recipe(reader_client, dataset, settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    recipe = dataset['recipes'][0]
+    response = reader_client.put(f'/api/recipes/{recipe.id}/',
+                                 get_payload(recipe), format='json')
+    assert response.status_code == 200
+    recipe.refresh_from_db()
+    return recipe
+
+
+@pytest.mark.django_db
+def test_unchanged_recipe_update_writes_nothing(reader_client, recipe,
+                                                monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(signals, 'schedule_renditions', scheduled.append)
+
+    with CaptureQueriesContext(connection) as context:
+        response = reader_client.put(f'/api/recipes/{recipe.id}/',
+                                     get_payload(recipe), format='json')
+
+    assert response.status_code == 200
+    assert get_writes(context) == []
+    assert scheduled == []
+
+
+@pytest.mark.django_db
+def test_new_image_content_is_saved(reader_client, recipe):
+    old_name = recipe.image.name
+
+    with CaptureQueriesContext(connection) as context:
+        response = reader_client.put(f'/api/recipes/{recipe.id}/',
+                                     get_payload(recipe, PNG + b'\0'),
+                                     format='json')
+
+    assert response.status_code == 200
+    recipe.refresh_from_db()
+    assert recipe.image.name != old_name
+    assert [sql for sql in get_writes(context)
+            if sql.startswith('UPDATE "api_recipe" SET "image"')]
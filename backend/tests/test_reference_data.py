@@ -0,0 +1,89 @@
+import pytest
+from rest_framework.authtoken.models import Token
+
+from api.cache import bump_reference_data_version
+from api.ingredient_index import IngredientIndex
+from api.models import Ingredient
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', [
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=Инг',
+])
+def test_reference_data_is_cached_by_etag(client, dataset, url):
+    response = client.get(url)
+    etag = response['ETag']
+
+    assert response.status_code == 200
+    assert 'max-age=' in response['Cache-Control']
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+
+
+@pytest.mark.django_db
+def test_revalidation_with_token_skips_database(
+    client, dataset, django_assert_num_queries
+):
+    token = Token.objects.create(user=dataset['reader'])
+    etag = client.get('/api/tags/')['ETag']
+
+    with django_assert_num_queries(0):
+        response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag,
+                              HTTP_AUTHORIZATION=f'Token {token.key}')
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ingredient_change_updates_etag(client, dataset):
+    response = client.get('/api/ingredients/')
+    etag = response['ETag']
+
+    Ingredient.objects.create(name='Новый ингредиент', measurement_unit='г')
+
+    response = client.get('/api/ingredients/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert 'Новый ингредиент' in [item['name'] for item in response.json()]
+
+
+@pytest.fixture
+def sugar(db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='г')
+        for name in ('Ванильный сахар', 'сахарная пудра', 'Сахар',
+                     'мука', 'Сахар тростниковый')
+    )
+
+
+def names(entries):
+    return [entry['name'] for entry in entries]
+
+
+@pytest.mark.django_db
+def test_ingredient_index_puts_prefix_matches_first(sugar):
+    index = IngredientIndex()
+
+    assert names(index.search('САХ', 10)) == [
+        'Сахар', 'Сахар тростниковый', 'сахарная пудра', 'Ванильный сахар',
+    ]
+    assert names(index.search('сах', 2)) == ['Сахар', 'Сахар тростниковый']
+    assert names(index.search('пудр', 10)) == ['сахарная пудра']
+
+
+@pytest.mark.django_db
+def test_ingredient_index_rebuilds_after_version_bump(
+    sugar, django_assert_num_queries
+):
+    index = IngredientIndex()
+    assert names(index.search('мук', 10)) == ['мука']
+    Ingredient.objects.create(name='Мука ржаная', measurement_unit='г')
+
+    with django_assert_num_queries(0):
+        assert names(index.search('мук', 10)) == ['мука']
+
+    bump_reference_data_version()
+    with django_assert_num_queries(1):
+        assert names(index.search('мук', 10)) == ['мука', 'Мука ржаная']
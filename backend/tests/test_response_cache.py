@@ -0,0 +1,108 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+
+from api.cache import batch_invalidations, invalidate_recipe_responses
+from api.metrics import registry
+from api.models import Recipe
+
+User = get_user_model()
+
+
+def get_cache_stats(view):
+    return registry.snapshot()['response_cache'].get(
+        view, {'hits': 0, 'misses': 0}
+    )
+
+
+@pytest.fixture
+def anonymous(settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    return APIClient()
+
+
+@pytest.mark.django_db
+def test_recipe_response_is_cached_until_recipe_changes(
+    anonymous, dataset, django_capture_on_commit_callbacks
+):
+    recipe = dataset['recipes'][0]
+    url = f'/api/recipes/{recipe.id}/'
+    before = get_cache_stats('recipes-retrieve')
+
+    assert anonymous.get(url)['X-Cache'] == 'MISS'
+    assert anonymous.get(url)['X-Cache'] == 'HIT'
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.name = 'Новое название'
+        recipe.save(update_fields=['name'])
+    response = anonymous.get(url)
+
+    assert response['X-Cache'] == 'MISS'
+    assert response.data['name'] == 'Новое название'
+    after = get_cache_stats('recipes-retrieve')
+    assert after['hits'] - before['hits'] == 1
+    assert after['misses'] - before['misses'] == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('lookup', ['999999', 'abc'])
+def test_missing_recipe_is_not_cached(anonymous, dataset, lookup):
+    before = get_cache_stats('recipes-retrieve')
+
+    response = anonymous.get(f'/api/recipes/{lookup}/')
+
+    assert response.status_code == 404
+    assert 'X-Cache' not in response
+    assert get_cache_stats('recipes-retrieve') == before
+
+
+@pytest.mark.django_db
+def test_response_cache_stats_are_exported(anonymous, dataset):
+    anonymous.get('/api/recipes/')
+    anonymous.get('/api/recipes/')
+
+    response = anonymous.get('/metrics')
+
+    assert ('foodgram_response_cache_requests_total'
+            '{view="recipes-list",result="hits"}') in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_batched_invalidations_are_applied_at_once(
+    dataset, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    recipes = dataset['recipes'][:3]
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        with batch_invalidations():
+            for recipe in recipes:
+                invalidate_recipe_responses([recipe.id])
+    with django_assert_num_queries(1):
+        for callback in callbacks:
+            callback()
+
+    generations = Recipe.objects.filter(
+        id__in=[recipe.id for recipe in recipes]
+    ).values_list('cache_generation', flat=True)
+    assert list(generations) == [recipe.cache_generation + 1
+                                 for recipe in recipes]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('field, value, cached', [
+    ('password', 'new-password', True),
+    ('first_name', 'Новое имя', False),
+])
+def test_author_save_invalidates_only_shown_fields(
+    anonymous, dataset, django_capture_on_commit_callbacks,
+    field, value, cached
+):
+    recipe = dataset['recipes'][0]
+    url = f'/api/recipes/{recipe.id}/'
+    anonymous.get(url)
+
+    author = User.objects.get(id=recipe.author_id)
+    setattr(author, field, value)
+    with django_capture_on_commit_callbacks(execute=True):
+        author.save()
+
+    assert (anonymous.get(url)['X-Cache'] == 'HIT') is cached
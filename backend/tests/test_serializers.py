@@ -0,0 +1,87 @@
+import pytest
+from rest_framework.exceptions import ValidationError
+
+from api.models import Tag
+from api.serializers import (BulkPrimaryKeyRelatedField,
+                             RecipeIngredientSerializer)
+
+
+@pytest.mark.django_db
+def test_bulk_related_field_loads_objects_in_one_query(
+    dataset, django_assert_num_queries
+):
+    field = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
+    tags = dataset['tags']
+
+    with django_assert_num_queries(1):
+        result = field.to_internal_value([tag.id for tag in tags[::-1]])
+
+    assert result == tags[::-1]
+
+
+@pytest.mark.django_db
+def test_bulk_related_field_reports_all_unknown_ids(
+    dataset, django_assert_num_queries
+):
+    field = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
+
+    with django_assert_num_queries(1):
+        with pytest.raises(ValidationError) as error:
+            field.to_internal_value([dataset['tags'][0].id, 999, 998])
+
+    assert error.value.detail == [
+        'Объекты с такими id не существуют: 998, 999.'
+    ]
+
+
+@pytest.mark.django_db
+def test_recipe_ingredients_load_in_one_query(dataset,
+                                              django_assert_num_queries):
+    serializer = RecipeIngredientSerializer(many=True)
+    ingredients = dataset['ingredients'][:5]
+
+    with django_assert_num_queries(1):
+        items = serializer.to_internal_value([
+            {'id': ingredient.id, 'amount': 2} for ingredient in ingredients
+        ])
+
+    assert [item['ingredient'] for item in items] == ingredients
+
+
+@pytest.mark.django_db
+def test_recipe_ingredients_report_all_unknown_ids(
+    dataset, django_assert_num_queries
+):
+    serializer = RecipeIngredientSerializer(many=True)
+
+    with django_assert_num_queries(1):
+        with pytest.raises(ValidationError) as error:
+            serializer.to_internal_value([
+                {'id': 1001, 'amount': 1},
+                {'id': dataset['ingredients'][0].id, 'amount': 1},
+                {'id': 1000, 'amount': 1},
+            ])
+
+    assert error.value.detail == [
+        'Некоторые ингредиенты не существуют: 1000, 1001.'
+    ]
+
+
+@pytest.mark.django_db
+def test_recipe_create_reports_unknown_tags_and_ingredients(reader_client,
+                                                            dataset):
+    response = reader_client.post('/api/recipes/', {
+        'name': 'Новый',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'tags': [998, 999],
+        'ingredients': [{'id': 1000, 'amount': 1},
+                        {'id': 1001, 'amount': 1}],
+    }, format='json')
+
+    assert response.status_code == 400
+    errors = response.json()
+    assert errors['tags'] == ['Объекты с такими id не существуют: 998, 999.']
+    assert errors['ingredients'] == [
+        'Некоторые ингредиенты не существуют: 1000, 1001.'
+    ]
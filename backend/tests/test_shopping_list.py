@@ -0,0 +1,307 @@
+import json
+from io import StringIO
+
+import pytest
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import ShoppingCart, ShoppingCartIngredient
+from api.shopping_list import add_to_shopping_lists, calculate_shopping_lists
+
+User = get_user_model()
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+def download(client, query='', **headers):
+    response = client.get(f'{URL}{query}', **headers)
+    content = b''.join(response.streaming_content) if response.streaming \
+        else response.content
+    return response, content.decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query, headers, content_type, extension', [
+    ('', {}, 'text/plain', 'txt'),
+    ('?format=', {}, 'text/plain', 'txt'),
+    ('?format=csv', {}, 'text/csv', 'csv'),
+    ('?format=json', {}, 'application/json', 'json'),
+    ('', {'HTTP_ACCEPT': 'text/csv'}, 'text/csv', 'csv'),
+    ('', {'HTTP_ACCEPT': 'application/json'}, 'application/json', 'json'),
+])
+def test_download_formats(reader_client, query, headers, content_type,
+                          extension):
+    response, content = download(reader_client, query, **headers)
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith(content_type)
+    assert response['Content-Disposition'].endswith(
+        f'shopping_cart.{extension}"'
+    )
+    assert 'Ингредиент' in content
+
+
+@pytest.mark.django_db
+def test_download_json_matches_txt(reader_client):
+    _, txt = download(reader_client, '?format=txt')
+    _, content = download(reader_client, '?format=json')
+
+    assert [
+        f"{item['name']} - {item['amount']} {item['measurement_unit']}"
+        for item in json.loads(content)
+    ] == txt.splitlines()
+
+
+@pytest.mark.django_db
+def test_download_rejects_unknown_format(reader_client):
+    response, content = download(reader_client, '?format=pdf')
+
+    assert response.status_code == 400
+    assert 'format' in content
+
+
+@pytest.mark.django_db
+def test_download_requires_authentication(client):
+    response, content = download(client)
+
+    assert response.status_code == 401
+    assert content.startswith('detail: ')
+
+
+@pytest.mark.django_db
+def test_add_to_shopping_lists_adds_to_existing_totals(dataset):
+    user = dataset['users'][1]
+    ingredient = dataset['ingredients'][0]
+
+    add_to_shopping_lists([(user.id, ingredient.id, 2)])
+    add_to_shopping_lists([(user.id, ingredient.id, 3),
+                           (user.id, dataset['ingredients'][1].id, 1)])
+
+    assert dict(user.shopping_cart_ingredients.values_list(
+        'ingredient_id', 'amount')) == {
+        ingredient.id: 5, dataset['ingredients'][1].id: 1
+    }
+
+
+def get_stored_totals():
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in
+        ShoppingCartIngredient.objects.values_list(
+            'user_id', 'ingredient_id', 'amount')
+    }
+
+
+@pytest.mark.django_db
+def test_deleting_author_removes_recipes_from_other_carts(dataset, settings):
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ]
+    author, buyer = dataset['users'][1], dataset['users'][2]
+    author.set_password('password')
+    author.save(update_fields=['password'])
+    client = APIClient()
+    client.force_authenticate(buyer)
+    for recipe in dataset['recipes'][:8]:
+        response = client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        assert response.status_code == 201
+    client.force_authenticate(author)
+
+    response = client.delete(f'/api/users/{author.id}/',
+                             {'current_password': 'password'})
+
+    assert response.status_code == 204
+    assert get_stored_totals() == calculate_shopping_lists()
+    assert buyer.shopping_cart_ingredients.exists()
+
+
+@pytest.mark.django_db
+def test_deleting_recipe_removes_it_from_carts(dataset):
+    recipe = dataset['recipes'][0]
+    assert recipe.in_shopping_cart.exists()
+
+    recipe.delete()
+
+    assert get_stored_totals() == calculate_shopping_lists()
+
+
+@pytest.mark.django_db
+def test_cart_endpoints_keep_totals(reader_client, dataset):
+    recipe = dataset['recipes'][1]
+
+    response = reader_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert response.status_code == 201
+    assert get_stored_totals() == calculate_shopping_lists()
+
+    response = reader_client.delete(
+        f'/api/recipes/{recipe.id}/shopping_cart/'
+    )
+    assert response.status_code == 204
+    assert get_stored_totals() == calculate_shopping_lists()
+
+
+@pytest.mark.django_db
+def test_changing_recipe_ingredients_updates_totals(reader_client, dataset):
+    recipe = dataset['recipes'][0]
+    assert recipe.in_shopping_cart.exists()
+    ingredients = dataset['ingredients']
+    reader_id = dataset['reader'].id
+    before = get_stored_totals()
+
+    response = reader_client.patch(f'/api/recipes/{recipe.id}/', {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'tags': [dataset['tags'][0].id],
+        'ingredients': [
+            {'id': ingredients[0].id, 'amount': 7},
+            {'id': ingredients[10].id, 'amount': 4},
+        ],
+    }, format='json')
+
+    assert response.status_code == 200
+    after = get_stored_totals()
+    assert after == calculate_shopping_lists()
+    assert after[(reader_id, ingredients[0].id)] == (
+        before[(reader_id, ingredients[0].id)] - 1 + 7
+    )
+    assert after[(reader_id, ingredients[10].id)] == (
+        before[(reader_id, ingredients[10].id)] + 4
+    )
+    assert after.get((reader_id, ingredients[1].id), 0) == (
+        before[(reader_id, ingredients[1].id)] - 2
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(connection.vendor != 'postgresql',
+                    reason='LOCK TABLE is PostgreSQL-only')
+def test_rebuild_reads_carts_under_lock(dataset):
+    ShoppingCartIngredient.objects.filter(user=dataset['reader']).update(
+        amount=1
+    )
+    out = StringIO()
+    call_command('rebuild_shopping_lists', '--verify', stdout=out)
+    assert 'out of date' in out.getvalue()
+
+    with CaptureQueriesContext(connection) as context:
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+
+    assert get_stored_totals() == calculate_shopping_lists()
+    queries = [query['sql'] for query in context.captured_queries]
+    lock = next(i for i, sql in enumerate(queries)
+                if sql.startswith('LOCK TABLE'))
+    read = next(i for i, sql in enumerate(queries)
+                if 'SELECT' in sql and 'api_recipeingredient' in sql)
+    assert lock < read
+    assert queries[0].startswith('SAVEPOINT')
+
+
+@pytest.fixture
+def admin_client(client, db):
+    """Клиент, вошедший в админку суперпользователем."""
+    client.force_login(User.objects.create_superuser(
+        email='admin@example.com', username='admin', password=None
+    ))
+    return client
+
+
+@pytest.mark.django_db
+def test_admin_cannot_add_cart_entries(admin_client, dataset):
+    response = admin_client.get('/admin/api/shoppingcart/add/')
+
+    assert response.status_code == 403
+
+
+@pytest.mark.django_db
+def test_admin_cart_deletion_keeps_totals(admin_client, dataset):
+    entries = list(ShoppingCart.objects.filter(user=dataset['reader']))
+
+    response = admin_client.post(
+        f'/admin/api/shoppingcart/{entries[0].id}/delete/', {'post': 'yes'}
+    )
+    assert response.status_code == 302
+    response = admin_client.post('/admin/api/shoppingcart/', {
+        'action': 'delete_selected',
+        '_selected_action': [entry.id for entry in entries[1:]],
+        'post': 'yes',
+    })
+    assert response.status_code == 302
+
+    assert not ShoppingCart.objects.filter(user=dataset['reader']).exists()
+    assert get_stored_totals() == calculate_shopping_lists()
+
+
+@pytest.mark.django_db
+def test_admin_recipe_ingredients_are_read_only(admin_client, dataset):
+    recipe = dataset['recipes'][0]
+
+    response = admin_client.get(f'/admin/api/recipe/{recipe.id}/change/')
+
+    assert response.status_code == 200
+    content = response.content.decode()
+    assert recipe.recipe_ingredients.first().ingredient.name in content
+    assert 'name="recipe_ingredients-0-amount"' not in content
+
+
+async def call_asgi(path, query, headers):
+    communicator = ApplicationCommunicator(ASGIHandler(), {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), *headers],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    })
+    await communicator.send_input({'type': 'http.request'})
+    start = await communicator.receive_output(5)
+    body = b''
+    while True:
+        message = await communicator.receive_output(5)
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return start['status'], body.decode()
+
+
+def asgi_get(path, query='', headers=()):
+    """
+    Выполняет GET через ASGIHandler, как сервер uvicorn. Как и тестовый
+    клиент Django, не закрывает подключение к базе сигналами начала
+    и конца запроса, иначе транзакция теста оборвётся.
+    """
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        return async_to_sync(call_asgi)(path, query, headers)
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query', ['', 'format=csv', 'format=json'])
+def test_download_under_asgi(reader_client, dataset, query):
+    token = Token.objects.create(user=dataset['reader'])
+    expected = download(reader_client, f'?{query}')[1]
+
+    status, content = asgi_get(
+        URL, query, [(b'authorization', f'Token {token.key}'.encode())]
+    )
+
+    assert status == 200
+    assert content == expected
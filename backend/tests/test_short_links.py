@@ -0,0 +1,71 @@
+import base64
+
+import pytest
+from django.conf import settings
+
+from api.encoding import ALPHABET, decode_id, encode_id, is_legacy_code
+
+
+def legacy_code(id):
+    return base64.urlsafe_b64encode(str(id).encode()).decode()
+
+
+@pytest.mark.parametrize('id', [0, 1, 61, 62, 3843, 3844, 10 ** 12])
+def test_encode_decode_round_trip(id):
+    code = encode_id(id)
+
+    assert set(code) <= set(ALPHABET)
+    assert not is_legacy_code(code)
+    assert decode_id(code) == id
+
+
+def test_codes_that_look_like_legacy_are_prefixed():
+    code = legacy_code(123)
+    id = 0
+    for char in code:
+        id = id * len(ALPHABET) + ALPHABET.index(char)
+
+    assert encode_id(id) == f'0{code}'
+    assert decode_id(encode_id(id)) == id
+
+
+@pytest.mark.parametrize('id', [1, 42, 123456])
+def test_legacy_base64_codes_are_decoded(id):
+    assert is_legacy_code(legacy_code(id))
+    assert decode_id(legacy_code(id)) == id
+
+
+@pytest.mark.django_db
+def test_legacy_short_link_redirects(client, dataset):
+    recipe = dataset['recipes'][0]
+
+    response = client.get(f'/api/s/{legacy_code(recipe.id)}/')
+
+    assert response.status_code == 302
+    assert response['Location'] == f'{settings.BASE_URL}recipes/{recipe.id}'
+
+
+@pytest.mark.django_db
+def test_short_link_redirects_to_absolute_recipe_url(client, dataset):
+    recipe = dataset['recipes'][0]
+
+    response = client.get(f'/api/s/{encode_id(recipe.id)}/')
+
+    assert response.status_code == 302
+    assert response['Location'] == f'{settings.BASE_URL}recipes/{recipe.id}'
+
+
+@pytest.mark.django_db
+def test_short_link_to_deleted_recipe_is_not_found(client, dataset):
+    recipe = dataset['recipes'][0]
+    url = f'/api/s/{encode_id(recipe.id)}/'
+    assert client.get(url).status_code == 302
+
+    recipe.delete()
+
+    assert client.get(url).status_code == 404
+
+
+@pytest.mark.django_db
+def test_invalid_short_link_is_not_found(client):
+    assert client.get('/api/s/not-a-code!/').status_code == 404
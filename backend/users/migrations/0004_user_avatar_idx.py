@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['avatar'], name='user_avatar_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from foodgram.storage import content_storage
+
 
 class User(AbstractUser):
     """
@@ -12,7 +14,8 @@ class User(AbstractUser):
         verbose_name='Электронная почта'
     )
     avatar = models.ImageField(
-        upload_to='avatar/',
+        upload_to='content/',
+        storage=content_storage,
         blank=True,
         null=True,
         verbose_name='Аватар'
@@ -29,6 +32,21 @@ class User(AbstractUser):
         blank=False,
         verbose_name='Фамилия'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписок'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = (
@@ -44,3 +62,6 @@ class User(AbstractUser):
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            models.Index(fields=['avatar'], name='user_avatar_idx'),
+        ]